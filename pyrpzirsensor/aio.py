@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import OrderedDict
+
+from . i2c import CompositeSensor
+
+
+class AsyncSensor(object):
+    """asyncio counterpart of a sensor driver.
+
+    Bus accesses of the driver's ``sample()`` run in an executor and its
+    waits are done with ``asyncio.sleep``, so integrations do not block the
+    event loop. Samples of the same sensor are serialized by a lock, so
+    ``values()`` called while ``run()`` samples the sensor waits for that
+    integration instead of starting another one on the chip.
+
+    :param sensor: sensor driver
+    :param executor: executor for bus accesses. the loop's default\
+    executor if ``None``
+    """
+
+    def __init__(self, sensor, executor=None):
+        super(AsyncSensor, self).__init__()
+        self.__sensor = sensor
+        self.__executor = executor
+        self.__lock = None
+
+    @property
+    def sensor(self):
+        return self.__sensor
+
+    def attributes(self):
+        return self.__sensor.attributes()
+
+    @staticmethod
+    def __resume(generator_):
+        try:
+            return (False, next(generator_))
+        except StopIteration as e:
+            return (True, e.value)
+
+    async def values(self):
+        if self.__lock is None:
+            # created here so that it belongs to the running loop
+            self.__lock = asyncio.Lock()
+        async with self.__lock:
+            loop = asyncio.get_running_loop()
+            generator = self.__sensor.sample()
+            while True:
+                (done, result) = await loop.run_in_executor(
+                    self.__executor, self.__resume, generator
+                )
+                if done:
+                    return result
+                await asyncio.sleep(result)
+
+
+class AsyncCompositeSensor(object):
+    """asyncio counterpart of ``CompositeSensor``.
+
+    :param sensors: sensors to sample
+    :param executor: executor for bus accesses. the loop's default\
+    executor if ``None``
+    """
+
+    def __init__(self, sensors, executor=None):
+        super(AsyncCompositeSensor, self).__init__()
+        self.__sensors = tuple(
+            AsyncSensor(s, executor)
+            for s in CompositeSensor(sensors).sensors()
+        )
+        self.__latest_values = OrderedDict()
+
+    def sensors(self):
+        return self.__sensors
+
+    def attributes(self):
+        return sum(map(lambda x: x.attributes(), self.__sensors), tuple())
+
+    async def values(self):
+        """sample all sensors concurrently
+        """
+        results = await asyncio.gather(
+            *(s.values() for s in self.__sensors)
+        )
+        return sum(results, tuple())
+
+    async def get(self, attr):
+        for s in self.__sensors:
+            if attr in s.attributes():
+                values = await s.values()
+                return dict(zip(s.attributes(), values))[attr]
+        raise KeyError(attr)
+
+    def latest_values(self):
+        """returns the values collected by ``run``
+        """
+        return self.__latest_values
+
+    async def run(self, hook=None, interval=1, periods=None):
+        """sample each sensor at its own period until cancelled. if a\
+        sensor raises, the other sensors are stopped before the exception\
+        is raised, so nothing samples the bus or calls ``hook`` any more
+
+        :param hook: called with the latest values whenever a sensor has\
+        been sampled
+        :param interval: default sampling period in seconds
+        :param periods: dict of ``{sensor: period}`` keyed by the driver
+        """
+        periods = periods if periods is not None else {}
+        tasks = [
+            asyncio.ensure_future(self.__run_sensor(
+                s, hook, periods.get(s.sensor) or interval
+            )) for s in self.__sensors
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __run_sensor(self, sensor, hook, period):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            values = await sensor.values()
+            latest_values = OrderedDict(self.__latest_values)
+            latest_values.update(zip(sensor.attributes(), values))
+            self.__latest_values = latest_values
+            if hook is not None and not sensor.sensor.cached():
+                hook(latest_values)
+            deadline += period
+            now = loop.time()
+            if deadline < now:
+                deadline += ((now - deadline) // period + 1) * period
+            await asyncio.sleep(deadline - now)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import struct
+from contextlib import contextmanager
+from threading import Lock, RLock
+from time import sleep, perf_counter
+from weakref import WeakValueDictionary
+
+try:
+    from smbus import SMBus
+except ImportError:
+    SMBus = None
+
+
+def open_bus(bus_):
+    """returns SMBus compatible object
+
+    :param bus_: bus number or an object which implements\
+    ``read_i2c_block_data``, ``write_i2c_block_data`` and ``write_byte``
+    """
+    if isinstance(bus_, int):
+        if SMBus is None:
+            raise ImportError(
+                'smbus is required to open I2C bus {}'.format(bus_)
+            )
+        return SMBus(bus_)
+    return bus_
+
+
+def bus_number(bus_):
+    if isinstance(bus_, int):
+        return bus_
+    return getattr(bus_, 'bus_num', None)
+
+
+class SharedBus(object):
+    """SMBus handle shared by every driver on the same bus.
+
+    Each call holds the bus lock, and ``transaction()`` holds it across
+    several calls so that multi-step accesses are not interleaved with
+    other threads. The time spent waiting for the lock is recorded.
+
+    :param bus_: bus number or SMBus compatible object
+    """
+
+    def __init__(self, bus_):
+        super(SharedBus, self).__init__()
+        self.__bus = bus_
+        self.__i2c = open_bus(bus_)
+        self.__lock = RLock()
+        self.bus_num = bus_number(bus_)
+        self.acquisitions = 0
+        self.lock_wait = 0.0
+        self.lock_wait_max = 0.0
+        self.reopens = 0
+
+    @contextmanager
+    def transaction(self):
+        start = perf_counter()
+        with self.__lock:
+            wait = perf_counter() - start
+            self.acquisitions += 1
+            self.lock_wait += wait
+            if wait > self.lock_wait_max:
+                self.lock_wait_max = wait
+            yield self
+
+    def read_i2c_block_data(self, i2c_addr_, cmd_, length_):
+        with self.transaction():
+            return self.__i2c.read_i2c_block_data(i2c_addr_, cmd_, length_)
+
+    def write_i2c_block_data(self, i2c_addr_, cmd_, data_):
+        with self.transaction():
+            self.__i2c.write_i2c_block_data(i2c_addr_, cmd_, data_)
+
+    def write_byte(self, i2c_addr_, value_):
+        with self.transaction():
+            self.__i2c.write_byte(i2c_addr_, value_)
+
+    def reopen(self):
+        """close and open the bus again after an I/O error. objects given\
+        instead of a bus number are kept as they are
+        """
+        if not isinstance(self.__bus, int):
+            return
+        with self.transaction():
+            try:
+                self.__i2c.close()
+            except OSError:
+                pass
+            self.__i2c = open_bus(self.__bus)
+            self.reopens += 1
+
+    def statistics(self):
+        return {
+            'bus': self.bus_num,
+            'acquisitions': self.acquisitions,
+            'lock_wait': self.lock_wait,
+            'lock_wait_max': self.lock_wait_max,
+            'reopens': self.reopens
+        }
+
+
+_shared_buses = WeakValueDictionary()
+_shared_buses_lock = Lock()
+
+
+def get_shared_bus(bus_):
+    """returns the ``SharedBus`` for ``bus_``, opening it on first use
+
+    :param bus_: bus number, SMBus compatible object or ``SharedBus``
+    """
+    if isinstance(bus_, SharedBus):
+        return bus_
+    with _shared_buses_lock:
+        shared = _shared_buses.get(bus_)
+        if shared is None:
+            shared = SharedBus(bus_)
+            _shared_buses[bus_] = shared
+        return shared
+
+
+def shared_bus_statistics():
+    with _shared_buses_lock:
+        return [b.statistics() for b in _shared_buses.values()]
+
+
+class SimulatedDevice(object):
+    """In-memory register map of an I2C device.
+
+    :param registers_: initial register values as ``{address: value}``
+    """
+
+    def __init__(self, registers_=None):
+        super(SimulatedDevice, self).__init__()
+        self.registers = bytearray(256)
+        if registers_ is not None:
+            for (k, v) in registers_.items():
+                self.registers[k] = v
+
+    def register(self, cmd_):
+        """translate command byte into register address
+        """
+        return cmd_ & 0xFF
+
+    def read(self, cmd_, length_):
+        addr = self.register(cmd_)
+        return list(self.registers[addr:addr + length_])
+
+    def write(self, cmd_, data_):
+        addr = self.register(cmd_)
+        for (i, d) in enumerate(data_):
+            self.registers[addr + i] = d
+
+    def command(self, cmd_):
+        """handle a byte written without a register
+        """
+        pass
+
+
+class SimulatedBME280(SimulatedDevice):
+    """BME280 register map with a plausible calibration.
+
+    Writes follow the BME280 burst protocol: the first byte goes to the
+    command address and subsequent bytes are ``(address, value)`` pairs.
+    A forced measurement completes immediately.
+    """
+
+    calibration = (
+        27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500,
+        -14600, 6000
+    )
+    humidity_calibration = (75, 362, 0, 313, 50, 30)
+
+    def __init__(self, registers_=None):
+        super(SimulatedBME280, self).__init__()
+        self.registers[0xD0] = 0x60
+        self.registers[0x88:0xA0] = struct.pack(
+            '<HhhHhhhhhhhh', *self.calibration
+        )
+        (h1, h2, h3, h4, h5, h6) = self.humidity_calibration
+        self.registers[0xA1] = h1
+        self.registers[0xE1:0xE8] = struct.pack(
+            '<hBBBBb', h2, h3, (h4 >> 4) & 0xFF,
+            ((h5 & 0x0F) << 4) | (h4 & 0x0F), (h5 >> 4) & 0xFF, h6
+        )
+        self.set_adc(415148, 519888, 30000)
+        if registers_ is not None:
+            for (k, v) in registers_.items():
+                self.registers[k] = v
+
+    def set_adc(self, adc_p_, adc_t_, adc_h_):
+        self.registers[0xF7:0xFF] = bytes((
+            (adc_p_ >> 12) & 0xFF, (adc_p_ >> 4) & 0xFF, (adc_p_ << 4) & 0xF0,
+            (adc_t_ >> 12) & 0xFF, (adc_t_ >> 4) & 0xFF, (adc_t_ << 4) & 0xF0,
+            (adc_h_ >> 8) & 0xFF, adc_h_ & 0xFF
+        ))
+
+    def write(self, cmd_, data_):
+        addrs = [cmd_] + list(data_[1::2])
+        for (a, d) in zip(addrs, data_[0::2]):
+            if a == 0xE0 and d == 0xB6:
+                self.registers[0xF2:0xF6] = bytes(4)
+                continue
+            self.registers[a] = d
+            if a == 0xF4 and (d & 0x03) in (1, 2):
+                self.registers[0xF4] = d & 0xFC
+
+
+class SimulatedTSL2561(SimulatedDevice):
+    """TSL2561 register map. The command bit is ignored.
+    """
+
+    def __init__(self, registers_=None):
+        super(SimulatedTSL2561, self).__init__(registers_)
+        self.registers[0x0A] = 0x50
+        self.set_adc(1000, 200)
+
+    def register(self, cmd_):
+        return cmd_ & 0x0F
+
+    def set_adc(self, ch0_, ch1_):
+        self.registers[0x0C:0x10] = struct.pack('<HH', ch0_, ch1_)
+
+
+class SimulatedTSL2572(SimulatedDevice):
+    """TSL2572 register map. The command and type bits are ignored.
+
+    An integration cycle completes as soon as ``AEN`` is set and whenever
+    ``set_adc`` is called while the ALS is enabled. ``AINT`` is raised
+    after as many consecutive cycles with channel 0 outside the thresholds
+    as the persistence register requires, or after every cycle with a
+    persistence of 0, and the special function ``0xE6`` clears it.
+
+    After ``set_light`` each cycle computes the channels from the light
+    level, the gain and the integration time instead.
+    """
+
+    persistence_cycles = (0, 1, 2, 3) + tuple(
+        5 * (n - 3) for n in range(4, 16)
+    )
+    gain_map = {0x00: 1, 0x01: 8, 0x02: 16, 0x03: 120}
+
+    def __init__(self, registers_=None):
+        super(SimulatedTSL2572, self).__init__(registers_)
+        self.registers[0x01] = 0xFF
+        self.registers[0x12] = 0x34
+        self.out_of_range = 0
+        self.light = None
+        self.set_adc(1000, 200)
+
+    def register(self, cmd_):
+        return cmd_ & 0x1F
+
+    def is_enabled(self):
+        return self.registers[0x00] & 0x03 == 0x03
+
+    def set_adc(self, ch0_, ch1_):
+        self.registers[0x14:0x18] = struct.pack('<HH', ch0_, ch1_)
+        if self.is_enabled():
+            self.integrate()
+
+    def set_light(self, ch0_, ch1_):
+        """set counts per ms of both channels at gain 1. ``None`` goes back\
+        to the values of ``set_adc``
+        """
+        self.light = None if ch0_ is None else (ch0_, ch1_)
+        if self.is_enabled():
+            self.integrate()
+
+    def integrate(self):
+        """complete an integration cycle
+        """
+        if self.light is not None:
+            cycles = 256 - self.registers[0x01]
+            gain = self.gain_map[self.registers[0x0F] & 0x03]
+            if self.registers[0x0D] & 0x04:
+                gain *= 0.16
+            saturation = min(65535, 1024 * cycles)
+            self.registers[0x14:0x18] = struct.pack('<HH', *(
+                min(saturation, int(c * gain * cycles * 2.73))
+                for c in self.light
+            ))
+        (ch0, low, high) = struct.unpack(
+            '<HHH', self.registers[0x14:0x16] + self.registers[0x04:0x08]
+        )
+        if ch0 < low or ch0 > high:
+            self.out_of_range += 1
+        else:
+            self.out_of_range = 0
+        persistence = self.persistence_cycles[self.registers[0x0C] & 0x0F]
+        self.registers[0x13] |= 0x01
+        if persistence == 0 or self.out_of_range >= persistence:
+            self.registers[0x13] |= 0x10
+
+    def write(self, cmd_, data_):
+        enabled = self.is_enabled()
+        super(SimulatedTSL2572, self).write(cmd_, data_)
+        if self.registers[0x00] & 0x01 == 0x00:
+            self.registers[0x13] &= 0xEE
+        if not self.is_enabled():
+            self.out_of_range = 0
+        elif not enabled:
+            self.integrate()
+
+    def command(self, cmd_):
+        if cmd_ == 0xE6:
+            self.registers[0x13] &= 0xEF
+
+
+class SimulatedSMBus(object):
+    """In-memory SMBus which serves register maps of simulated devices.
+
+    :param devices_: dict of ``{i2c_addr: SimulatedDevice}``
+    :param latency_: seconds spent by each transaction
+    :param bus_num_: bus number reported to the drivers
+    """
+
+    def __init__(self, devices_=None, latency_=0.0, bus_num_=None):
+        super(SimulatedSMBus, self).__init__()
+        self.devices = dict(devices_) if devices_ is not None else {}
+        self.latency = latency_
+        self.bus_num = bus_num_
+        self.transactions = 0
+        self.__lock = Lock()
+
+    def __device(self, i2c_addr_):
+        with self.__lock:
+            self.transactions += 1
+        if self.latency > 0:
+            sleep(self.latency)
+        if i2c_addr_ not in self.devices:
+            raise OSError(errno.EREMOTEIO, 'Remote I/O error')
+        return self.devices[i2c_addr_]
+
+    def reset_counter(self):
+        with self.__lock:
+            self.transactions = 0
+
+    def read_i2c_block_data(self, i2c_addr_, cmd_, length_):
+        return self.__device(i2c_addr_).read(cmd_, length_)
+
+    def write_i2c_block_data(self, i2c_addr_, cmd_, data_):
+        self.__device(i2c_addr_).write(cmd_, list(data_))
+
+    def write_byte(self, i2c_addr_, value_):
+        self.__device(i2c_addr_).command(value_)
+
+    def close(self):
+        pass
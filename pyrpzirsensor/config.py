@@ -3,6 +3,8 @@
 
 DEBUG = False
 HOST = '0.0.0.0'
+I2C_BUS = 1
+I2C_REGISTER_SHADOW = False
 BME280_ADDRESS = 0x77
 ILLUMINANCE_SENSOR_ADDRESS = 0x39 # 0x29 for TSL2561
 
@@ -12,5 +14,33 @@ BME280_HUMIDITY_OVERSAMPLING = 1
 BME280_PRESSURE_OVERSAMPLING = 16
 BME280_TEMPERATURE_OVERSAMPLING = 2
 BME280_INACTIVE_DURATION = 1000
+BME280_CALIBRATION_CACHE = None
 
 ILLUMINANCE_SENSOR = 'TSL2572'
+ILLUMINANCE_SENSOR_CONTINUOUS = False
+ILLUMINANCE_SENSOR_THRESHOLD = 0.1
+ILLUMINANCE_SENSOR_PERSISTENCE = 2
+ILLUMINANCE_SENSOR_MAX_AGE = 60
+
+SAMPLING_INTERVAL = 1
+BME280_SAMPLING_PERIOD = None
+ILLUMINANCE_SENSOR_SAMPLING_PERIOD = None
+STALE_TOLERANCE = 2
+SENSOR_MAX_BACKOFF = 60
+HOOK_QUEUE_SIZE = 64
+HOOK_POLICY = 'drop_oldest'
+STREAM_QUEUE_SIZE = 16
+STREAM_KEEPALIVE = 15
+
+HISTORY_CAPACITY = 3600
+HISTORY_AGGREGATE_WINDOWS = (60, 600, 3600)
+HISTORY_MAX_STEPS = 1440
+HISTORY_TIERS = ((60, 1440), (900, 2880))
+
+STORAGE_DIRECTORY = None
+STORAGE_SEGMENT_RECORDS = 86400
+STORAGE_RESTORE_SECONDS = 3600
+STORAGE_COMMIT_RECORDS = 60
+STORAGE_COMMIT_INTERVAL = 60
+STORAGE_QUEUE_SIZE = 3600
+STORAGE_DURABILITY = 'flush'
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from threading import Condition, Lock, Thread
+from time import monotonic
+
+
+class Subscription(object):
+    """Bounded queue of samples for one consumer of a ``Dispatcher``.
+
+    ``put`` never blocks. When the queue is full, ``policy_`` decides what
+    happens to the new sample: ``'drop_oldest'`` discards the oldest
+    queued sample, ``'drop_newest'`` discards the new one and
+    ``'coalesce'`` merges it into the newest queued sample, so the
+    consumer still sees the latest value of every attribute.
+
+    :param maxsize_: maximum number of queued samples
+    :param policy_: ``'drop_oldest'``, ``'drop_newest'`` or ``'coalesce'``
+    """
+
+    policies = ('drop_oldest', 'drop_newest', 'coalesce')
+
+    def __init__(self, maxsize_=64, policy_='drop_oldest'):
+        super(Subscription, self).__init__()
+        if policy_ not in self.policies:
+            raise ValueError(policy_)
+        if maxsize_ < 1:
+            raise ValueError(maxsize_)
+        self.maxsize = maxsize_
+        self.policy = policy_
+        self.closed = False
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_lag = 0.0
+        self.__queue = deque()
+        self.__condition = Condition(Lock())
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def put(self, timestamp_, values_):
+        """queue a sample without blocking
+
+        :param timestamp_: acquisition time
+        :param values_: dict of ``{attribute: value}``
+        """
+        with self.__condition:
+            if self.closed:
+                return
+            self.published += 1
+            if len(self.__queue) < self.maxsize:
+                self.__queue.append((monotonic(), timestamp_, values_))
+            elif self.policy == 'drop_oldest':
+                self.__queue.popleft()
+                self.__queue.append((monotonic(), timestamp_, values_))
+                self.dropped += 1
+            elif self.policy == 'drop_newest':
+                self.dropped += 1
+                return
+            else:
+                (queued, _, values) = self.__queue.pop()
+                values = dict(values)
+                values.update(values_)
+                self.__queue.append((queued, timestamp_, values))
+                self.coalesced += 1
+            self.__condition.notify()
+
+    def get(self, timeout_=None):
+        """returns the oldest queued ``(timestamp, values)``, waiting up to\
+        ``timeout_`` seconds. returns ``None`` on timeout or once closed
+        """
+        with self.__condition:
+            if not self.__condition.wait_for(
+                lambda: len(self.__queue) > 0 or self.closed, timeout_
+            ) or len(self.__queue) == 0:
+                return None
+            (queued, timestamp, values) = self.__queue.popleft()
+            self.delivered += 1
+            lag = monotonic() - queued
+            if lag > self.max_lag:
+                self.max_lag = lag
+            return (timestamp, values)
+
+    def close(self):
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+    def statistics(self):
+        return {
+            'policy': self.policy,
+            'maxsize': self.maxsize,
+            'pending': len(self.__queue),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'max_lag': self.max_lag
+        }
+
+
+class HookWorker(Thread):
+    """Calls a hook with the samples of a ``Subscription`` in its own
+    thread, so a slow hook only delays itself.
+
+    :param subscription_: ``Subscription`` to consume
+    :param hook_: called with the values of each sample
+    """
+
+    def __init__(self, subscription_, hook_):
+        super(HookWorker, self).__init__(daemon=True)
+        self.subscription = subscription_
+        self.__hook = hook_
+        self.errors = 0
+        self.start()
+
+    def run(self):
+        while True:
+            sample = self.subscription.get()
+            if sample is None:
+                return
+            try:
+                self.__hook(sample[1])
+            except Exception:
+                self.errors += 1
+
+    def statistics(self):
+        statistics = self.subscription.statistics()
+        statistics['errors'] = self.errors
+        return statistics
+
+
+class Dispatcher(object):
+    """Fans samples out to subscribers without blocking the publisher.
+    """
+
+    def __init__(self):
+        super(Dispatcher, self).__init__()
+        self.__subscriptions = ()
+        self.__workers = ()
+        self.__lock = Lock()
+
+    def subscribe(self, maxsize_=64, policy_='drop_oldest'):
+        """returns a new ``Subscription`` which receives every sample\
+        published from now on
+        """
+        subscription = Subscription(maxsize_, policy_)
+        with self.__lock:
+            self.__subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription_):
+        subscription_.close()
+        with self.__lock:
+            self.__subscriptions = tuple(
+                s for s in self.__subscriptions if s is not subscription_
+            )
+
+    def add_hook(self, hook_, maxsize_=64, policy_='drop_oldest'):
+        """call ``hook_`` with the values of each sample from a\
+        ``HookWorker``
+        """
+        worker = HookWorker(self.subscribe(maxsize_, policy_), hook_)
+        with self.__lock:
+            self.__workers += (worker,)
+        return worker
+
+    def publish(self, timestamp_, values_):
+        for s in self.__subscriptions:
+            s.put(timestamp_, values_)
+
+    def close(self):
+        with self.__lock:
+            (subscriptions, self.__subscriptions) = (self.__subscriptions, ())
+            self.__workers = ()
+        for s in subscriptions:
+            s.close()
+
+    def statistics(self):
+        workers = self.__workers
+        hooked = set(id(w.subscription) for w in workers)
+        return {
+            'hooks': [w.statistics() for w in workers],
+            'subscriptions': [
+                s.statistics() for s in self.__subscriptions
+                if id(s) not in hooked
+            ]
+        }
@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left
+from collections import deque
+from math import fsum, sqrt, floor
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def aggregate(values_, percentiles_=()):
+    """returns count, min, max, mean, population standard deviation and
+    percentiles (linear interpolation) of ``values_``
+
+    :param values_: sequence of floats
+    :param percentiles_: percentiles to compute, each in ``[0, 100]``
+    """
+    n = len(values_)
+    result = {'count': n}
+    if n == 0:
+        result.update(min=None, max=None, mean=None, stddev=None)
+        result.update(('p{:g}'.format(p), None) for p in percentiles_)
+        return result
+    if numpy is not None:
+        return aggregate_slices(values_, (n, ), percentiles_)[0]
+    mean = fsum(values_) / n
+    result.update(
+        min=min(values_), max=max(values_), mean=mean,
+        stddev=sqrt(fsum([(v - mean) ** 2 for v in values_]) / n)
+    )
+    if len(percentiles_) > 0:
+        ordered = sorted(values_)
+        for p in percentiles_:
+            rank = (n - 1) * p / 100
+            lo = int(floor(rank))
+            hi = min(lo + 1, n - 1)
+            result['p{:g}'.format(p)] = \
+                ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+    return result
+
+
+def aggregate_slices(values_, stops_, percentiles_=()):
+    """returns ``aggregate`` of each of the consecutive slices of
+    ``values_`` which end at ``stops_``; the first one starts at ``0``.
+
+    With numpy every slice is aggregated at once with ``reduceat`` and one
+    sort, otherwise the slices are aggregated one by one.
+
+    :param values_: sequence of floats
+    :param stops_: non-decreasing end indices of the slices
+    :param percentiles_: percentiles to compute, each in ``[0, 100]``
+    """
+    if numpy is None:
+        (result, start) = ([], 0)
+        for stop in stops_:
+            result.append(aggregate(values_[start:stop], percentiles_))
+            start = stop
+        return result
+    stops = numpy.asarray(stops_, dtype=numpy.intp)
+    if len(stops) == 0:
+        return []
+    starts = numpy.concatenate(([0], stops[:-1]))
+    filled = numpy.flatnonzero(stops > starts)
+    empty = aggregate((), percentiles_)
+    result = [dict(empty) for _ in range(len(stops))]
+    if len(filled) == 0:
+        return result
+    # slices are contiguous, so the empty ones do not split the others
+    values = numpy.asarray(values_, dtype=numpy.float64)[:stops[-1]]
+    (first, n) = (starts[filled], (stops - starts)[filled])
+    mean = numpy.add.reduceat(values, first) / n
+    deviation = values - numpy.repeat(mean, n)
+    columns = {
+        'min': numpy.minimum.reduceat(values, first),
+        'max': numpy.maximum.reduceat(values, first),
+        'mean': mean,
+        'stddev': numpy.sqrt(
+            numpy.add.reduceat(deviation * deviation, first) / n
+        )
+    }
+    if len(percentiles_) > 0:
+        ordered = values[numpy.lexsort(
+            (values, numpy.repeat(numpy.arange(len(first)), n))
+        )]
+        for p in percentiles_:
+            rank = (n - 1) * p / 100
+            lo = numpy.floor(rank).astype(numpy.intp)
+            hi = numpy.minimum(lo + 1, n - 1)
+            low = ordered[first + lo]
+            columns['p{:g}'.format(p)] = \
+                low + (ordered[first + hi] - low) * (rank - lo)
+    keys = tuple(columns.keys())
+    for (i, count, row) in zip(
+        filled.tolist(), n.tolist(), zip(*(columns[k].tolist() for k in keys))
+    ):
+        bucket = result[i]
+        bucket['count'] = count
+        bucket.update(zip(keys, row))
+    return result
+
+
+class RollingWindow(object):
+    """Aggregate of the samples of a ``RingBuffer`` within the last
+    ``window_`` seconds, maintained as samples are appended.
+
+    Sums are kept relative to the first sample in the window to limit
+    cancellation, and min and max are kept in monotonic queues of sample
+    indices, so a query costs O(1) amortized.
+
+    :param window_: window length in seconds
+    :param timestamp_at_: function returning the timestamp of an index
+    :param value_at_: function returning the value of an index
+    """
+
+    def __init__(self, window_, timestamp_at_, value_at_):
+        super(RollingWindow, self).__init__()
+        self.window = window_
+        self.__timestamp_at = timestamp_at_
+        self.__value_at = value_at_
+        self.__tail = 0
+        self.__head = 0
+        self.__offset = 0.0
+        self.__sum = 0.0
+        self.__sumsq = 0.0
+        self.__mins = deque()
+        self.__maxs = deque()
+
+    def push(self, index_, value_):
+        if self.__tail == self.__head:
+            self.__tail = index_
+            self.__offset = value_
+        d = value_ - self.__offset
+        self.__sum += d
+        self.__sumsq += d * d
+        while len(self.__mins) > 0 and \
+                self.__value_at(self.__mins[-1]) >= value_:
+            self.__mins.pop()
+        self.__mins.append(index_)
+        while len(self.__maxs) > 0 and \
+                self.__value_at(self.__maxs[-1]) <= value_:
+            self.__maxs.pop()
+        self.__maxs.append(index_)
+        self.__head = index_ + 1
+
+    def evict(self, since_, min_index_=0):
+        """drop samples older than ``since_`` or with smaller index than
+        ``min_index_``
+        """
+        while self.__tail < self.__head and (
+            self.__tail < min_index_ or
+            self.__timestamp_at(self.__tail) < since_
+        ):
+            d = self.__value_at(self.__tail) - self.__offset
+            self.__sum -= d
+            self.__sumsq -= d * d
+            if self.__mins[0] == self.__tail:
+                self.__mins.popleft()
+            if self.__maxs[0] == self.__tail:
+                self.__maxs.popleft()
+            self.__tail += 1
+        if self.__tail == self.__head:
+            self.__sum = 0.0
+            self.__sumsq = 0.0
+
+    def query(self, now_):
+        self.evict(now_ - self.window)
+        n = self.__head - self.__tail
+        if n == 0:
+            return aggregate(())
+        mean = self.__sum / n
+        return {
+            'count': n,
+            'min': self.__value_at(self.__mins[0]),
+            'max': self.__value_at(self.__maxs[0]),
+            'mean': self.__offset + mean,
+            'stddev': sqrt(max(0.0, self.__sumsq / n - mean * mean))
+        }
+
+
+class RingBuffer(object):
+    """Fixed capacity time series of float64 samples.
+
+    Timestamps and values are kept in two preallocated ``array('d')``, so
+    the memory usage is ``16 * capacity_`` bytes regardless of how many
+    samples have been appended. Timestamps must not decrease, so a sample
+    older than the latest one, e.g. after the wall clock stepped back, is
+    discarded and counted in ``discarded``.
+
+    :param capacity_: number of samples to keep
+    :param windows_: window lengths in seconds for which a\
+    ``RollingWindow`` is maintained
+    """
+
+    def __init__(self, capacity_, windows_=()):
+        super(RingBuffer, self).__init__()
+        if capacity_ <= 0:
+            raise ValueError(capacity_)
+        self.capacity = capacity_
+        self.__timestamps = array('d', bytes(8 * capacity_))
+        self.__values = array('d', bytes(8 * capacity_))
+        self.__head = 0
+        self.__length = 0
+        self.__total = 0
+        self.discarded = 0
+        self.__lock = Lock()
+        self.__rolling = dict(
+            (w, RollingWindow(w, self.__timestamp_at, self.__value_at))
+            for w in windows_
+        )
+
+    def __len__(self):
+        return self.__length
+
+    def __timestamp_at(self, index_):
+        return self.__timestamps[index_ % self.capacity]
+
+    def __value_at(self, index_):
+        return self.__values[index_ % self.capacity]
+
+    def append(self, timestamp_, value_):
+        """append a sample. returns ``False`` if it was discarded because it
+        is older than the latest sample
+        """
+        with self.__lock:
+            if self.__length > 0 and \
+                    timestamp_ < self.__timestamp_at(self.__total - 1):
+                self.discarded += 1
+                return False
+            index = self.__total
+            for r in self.__rolling.values():
+                r.evict(timestamp_ - r.window, index - self.capacity + 1)
+            i = index % self.capacity
+            self.__timestamps[i] = timestamp_
+            self.__values[i] = value_
+            self.__total += 1
+            if self.__length < self.capacity:
+                self.__length += 1
+            else:
+                self.__head = (self.__head + 1) % self.capacity
+            for r in self.__rolling.values():
+                r.push(index, value_)
+            return True
+
+    def windows(self):
+        return tuple(self.__rolling.keys())
+
+    def rolling(self, window_, now_):
+        """returns the aggregate of the maintained window ``window_``
+        ending at ``now_``. samples older than the window are discarded, so
+        ``now_`` must not decrease between calls
+        """
+        with self.__lock:
+            return self.__rolling[window_].query(now_)
+
+    def __bisect(self, timestamp_):
+        """returns the logical index of the first sample at or after
+        ``timestamp_``
+        """
+        (lo, hi) = (0, self.__length)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__timestamps[(self.__head + mid) % self.capacity] < \
+                    timestamp_:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __slice(self, buf_, start_, stop_):
+        begin = self.__head + start_
+        end = self.__head + stop_
+        if end <= self.capacity:
+            return buf_[begin:end]
+        if begin >= self.capacity:
+            return buf_[begin - self.capacity:end - self.capacity]
+        return buf_[begin:] + buf_[:end - self.capacity]
+
+    def slice(self, start_, stop_):
+        """returns ``(timestamps, values)`` arrays of the samples between
+        logical indices ``start_`` and ``stop_``; ``0`` is the oldest sample
+        """
+        with self.__lock:
+            start = max(0, min(start_, self.__length))
+            stop = max(start, min(stop_, self.__length))
+            return (
+                self.__slice(self.__timestamps, start, stop),
+                self.__slice(self.__values, start, stop)
+            )
+
+    def window(self, since_, until_=None):
+        """returns ``(timestamps, values)`` arrays of the samples taken at
+        or after ``since_`` and before ``until_``
+        """
+        with self.__lock:
+            start = self.__bisect(since_)
+            stop = self.__length if until_ is None else self.__bisect(until_)
+            stop = max(start, stop)
+            return (
+                self.__slice(self.__timestamps, start, stop),
+                self.__slice(self.__values, start, stop)
+            )
+
+    def last(self, n_):
+        """returns ``(timestamps, values)`` arrays of the latest ``n_``
+        samples
+        """
+        return self.slice(len(self) - n_, len(self))
+
+
+class RollupTier(object):
+    """Downsampled time series keeping min, mean and max per bucket.
+
+    Samples are accumulated into the open bucket as they arrive and the
+    bucket is moved into ring buffers once a sample of a later bucket
+    comes, so nothing is recomputed.
+
+    :param resolution_: bucket length in seconds
+    :param capacity_: number of buckets to keep
+    """
+
+    def __init__(self, resolution_, capacity_):
+        super(RollupTier, self).__init__()
+        self.resolution = resolution_
+        self.capacity = capacity_
+        self.__min = RingBuffer(capacity_)
+        self.__mean = RingBuffer(capacity_)
+        self.__max = RingBuffer(capacity_)
+        self.__count = RingBuffer(capacity_)
+        self.__lock = Lock()
+        self.__open = None
+
+    def retention(self):
+        return self.resolution * self.capacity
+
+    def add(self, timestamp_, value_):
+        start = floor(timestamp_ / self.resolution) * self.resolution
+        with self.__lock:
+            if self.__open is not None and start < self.__open[0]:
+                return
+            if self.__open is not None and self.__open[0] != start:
+                self.__flush()
+            if self.__open is None:
+                self.__open = [start, value_, value_, value_, 1]
+            else:
+                o = self.__open
+                o[1] = min(o[1], value_)
+                o[2] += value_
+                o[3] = max(o[3], value_)
+                o[4] += 1
+
+    def __flush(self):
+        (start, min_, sum_, max_, count) = self.__open
+        self.__min.append(start, min_)
+        self.__mean.append(start, sum_ / count)
+        self.__max.append(start, max_)
+        self.__count.append(start, count)
+        self.__open = None
+
+    def window(self, since_, until_=None):
+        """returns buckets starting in ``[since_, until_)`` as a dict of
+        ``timestamp``, ``min``, ``mean``, ``max`` and ``count`` arrays,
+        including the open bucket
+        """
+        since = floor(since_ / self.resolution) * self.resolution
+        with self.__lock:
+            (timestamps, mins) = self.__min.window(since, until_)
+            result = {
+                'timestamp': timestamps,
+                'min': mins,
+                'mean': self.__mean.window(since, until_)[1],
+                'max': self.__max.window(since, until_)[1],
+                'count': self.__count.window(since, until_)[1]
+            }
+            o = self.__open
+            if o is not None and o[0] >= since and \
+                    (until_ is None or o[0] < until_):
+                for (k, v) in zip(
+                    ('timestamp', 'min', 'mean', 'max', 'count'),
+                    (o[0], o[1], o[2] / o[4], o[3], o[4])
+                ):
+                    result[k].append(v)
+            return result
+
+
+class History(object):
+    """Ring buffers of every attribute of a composite sensor.
+
+    Besides the raw samples, each attribute can keep ``RollupTier``s of
+    coarser resolution and longer retention.
+
+    :param attributes_: attribute names
+    :param capacity_: number of raw samples to keep per attribute
+    :param windows_: window lengths in seconds whose aggregates are\
+    maintained incrementally
+    :param tiers_: sequence of ``(resolution, capacity)`` of rollup tiers
+    """
+
+    def __init__(self, attributes_, capacity_, windows_=(), tiers_=()):
+        super(History, self).__init__()
+        self.__buffers = dict(
+            (a, RingBuffer(capacity_, windows_)) for a in attributes_
+        )
+        self.__tiers = dict(
+            (a, tuple(
+                RollupTier(r, c) for (r, c) in sorted(tiers_)
+            )) for a in attributes_
+        )
+
+    def attributes(self):
+        return tuple(self.__buffers.keys())
+
+    def __getitem__(self, attr):
+        return self.__buffers[attr]
+
+    def record(self, timestamp_, values_):
+        """append samples. returns the dict of the values which were
+        recorded, i.e. without those older than the latest sample of their
+        attribute
+
+        :param timestamp_: acquisition time
+        :param values_: dict of ``{attribute: value}``
+        """
+        recorded = {}
+        for (k, v) in values_.items():
+            if k in self.__buffers and \
+                    self.__buffers[k].append(timestamp_, v):
+                for t in self.__tiers[k]:
+                    t.add(timestamp_, v)
+                recorded[k] = v
+        return recorded
+
+    def window(self, attr, since_, until_=None):
+        return self.__buffers[attr].window(since_, until_)
+
+    def tiers(self, attr):
+        return self.__tiers[attr]
+
+    def query(self, attr, since_, until_=None, resolution_=None):
+        """returns samples of ``attr`` from the raw samples or a tier which
+        still covers ``since_``: the coarsest one whose resolution does not
+        exceed ``resolution_`` seconds (``0``, i.e. raw samples, if
+        ``None``), else the finest one which covers ``since_``. if nothing
+        covers it, the tier with the longest retention is used. raw samples
+        are returned as ``timestamp`` and ``value`` with ``resolution``
+        ``0``, buckets as ``timestamp``, ``min``, ``mean``, ``max`` and
+        ``count``.
+        """
+        buf = self.__buffers[attr]
+        tiers = self.__tiers[attr]
+        covering = [None] if self.__covers(buf, since_) else []
+        if len(buf) > 0:
+            latest = buf.last(1)[0][0]
+            covering.extend(
+                t for t in tiers if latest - t.retention() <= since_
+            )
+        else:
+            covering.extend(tiers)
+        limit = 0 if resolution_ is None else resolution_
+        fitting = [
+            t for t in covering if t is None or t.resolution <= limit
+        ]
+        if len(fitting) > 0:
+            chosen = fitting[-1]
+        elif len(covering) > 0:
+            chosen = covering[0]
+        else:
+            chosen = tiers[-1] if len(tiers) > 0 else None
+        if chosen is None:
+            (timestamps, values) = self.window(attr, since_, until_)
+            return {'resolution': 0, 'timestamp': timestamps, 'value': values}
+        result = chosen.window(since_, until_)
+        result['resolution'] = chosen.resolution
+        return result
+
+    @staticmethod
+    def __covers(buf_, since_):
+        """returns whether ``buf_`` has not discarded samples taken at or
+        after ``since_``
+        """
+        if len(buf_) < buf_.capacity:
+            return True
+        return buf_.slice(0, 1)[0][0] <= since_
+
+    def aggregate(self, attr, window_, now_, step_=None, percentiles_=()):
+        """returns aggregates of ``attr`` over the ``window_`` seconds
+        before ``now_``, or a list of aggregates per ``step_`` seconds
+
+        :param percentiles_: percentiles to compute
+        """
+        buf = self.__buffers[attr]
+        if step_ is None and len(percentiles_) == 0 and \
+                window_ in buf.windows():
+            return buf.rolling(window_, now_)
+        since = now_ - window_
+        (timestamps, values) = buf.window(since)
+        if step_ is None:
+            return aggregate(values, percentiles_)
+        edges = []
+        edge = since
+        while edge < now_:
+            edges.append(edge)
+            edge += step_
+        if numpy is not None:
+            stops = numpy.searchsorted(
+                numpy.asarray(timestamps, dtype=numpy.float64),
+                numpy.asarray(edges) + step_
+            )
+        else:
+            stops = []
+            for edge in edges:
+                stops.append(bisect_left(
+                    timestamps, edge + step_, stops[-1] if stops else 0
+                ))
+        result = aggregate_slices(values, stops, percentiles_)
+        for (bucket, edge) in zip(result, edges):
+            bucket['timestamp'] = edge
+        return result
@@ -1,21 +1,53 @@
 # -*- coding: utf-8 -*-
 
+import os
+import json
+import struct
+import time
 from collections import OrderedDict
 from threading import Thread
-from time import sleep
+from time import sleep, monotonic
 from abc import ABCMeta, abstractmethod
-from collections import Iterable
+from collections.abc import Iterable
 
-from smbus import SMBus
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from . import util
+from . bus import get_shared_bus
+from . scheduler import InterleavedScheduler
+from . history import History
+from . dispatch import Dispatcher
+from . snapshot import Snapshot
 
 
 class I2CSensorBase(metaclass=ABCMeta):
-    def __init__(self, i2c_addr_):
+    shadow_registers = frozenset()
+
+    def __init__(self, i2c_addr_, bus_=1, register_shadow_=False):
         super(I2CSensorBase, self).__init__()
         self.__i2c_addr = i2c_addr_
-        self.__i2c = SMBus(1)
+        self.__i2c = get_shared_bus(bus_)
+        self.__shadow = {} if register_shadow_ else None
+
+    @property
+    def i2c_addr(self):
+        return self.__i2c_addr
+
+    @property
+    def bus_num(self):
+        return self.__i2c.bus_num
+
+    @property
+    def bus(self):
+        return self.__i2c
+
+    def transaction(self):
+        """returns a context manager which holds the bus lock
+        """
+        return self.__i2c.transaction()
 
     def read_address(self, addr_, length_):
         return self.__i2c.read_i2c_block_data(
@@ -23,6 +55,10 @@ class I2CSensorBase(metaclass=ABCMeta):
         )
 
     def read_address_single(self, addr_):
+        if self.__is_shadowed(addr_):
+            if addr_ not in self.__shadow:
+                self.__shadow[addr_] = self.read_address(addr_, 1)[0]
+            return self.__shadow[addr_]
         return self.read_address(addr_, 1)[0]
 
     def read_address_twobyte(self, addr_):
@@ -44,9 +80,53 @@ class I2CSensorBase(metaclass=ABCMeta):
             self.__i2c_addr, addr_, data_
         )
 
+    def write_command(self, cmd_):
+        """write a command byte without data
+        """
+        self.__i2c.write_byte(self.__i2c_addr, cmd_)
+
     def write_address_single(self, addr_, datum_):
+        if self.__is_shadowed(addr_):
+            if self.__shadow.get(addr_) == datum_:
+                return
+            self.write_address(addr_, [datum_])
+            self.__shadow[addr_] = datum_
+            return
         self.write_address(addr_, [datum_])
 
+    def __is_shadowed(self, addr_):
+        return self.__shadow is not None and addr_ in self.shadow_registers
+
+    @property
+    def register_shadow(self):
+        return self.__shadow is not None
+
+    def store_register_shadow(self, addr_, datum_):
+        """record a value which was written without ``write_address_single``
+        """
+        if self.__is_shadowed(addr_):
+            self.__shadow[addr_] = datum_
+
+    def clear_register_shadow(self, addr_=None):
+        """forget shadowed register values so that they are read again
+
+        :param addr_: address to forget. all addresses if ``None``
+        """
+        if self.__shadow is None:
+            return
+        if addr_ is None:
+            self.__shadow.clear()
+        else:
+            self.__shadow.pop(addr_, None)
+
+    def recover(self):
+        """bring the sensor back after a failed sample: open the bus again\
+        and forget the shadowed registers, which a reset of the sensor may\
+        have changed
+        """
+        self.__i2c.reopen()
+        self.clear_register_shadow()
+
     def read_bits(self, addr_, offset_, length_):
         """Read bits
 
@@ -65,14 +145,12 @@ class I2CSensorBase(metaclass=ABCMeta):
         :param offset_: 0-7
         :param length_: length to read
         """
-        self.write_address_single(
-            addr_,
-            ((datum_ & ((1 << length_) - 1)) << offset_) |
-            (
-                self.read_address_single(addr_) &
-                (0xFF ^ (((1 << length_) - 1) << offset_))
+        with self.transaction():
+            self.write_address_single(
+                addr_, util.replace_bits(
+                    self.read_address_single(addr_), datum_, offset_, length_
+                )
             )
-        )
 
     @abstractmethod
     def attributes(self):
@@ -82,6 +160,21 @@ class I2CSensorBase(metaclass=ABCMeta):
     def values(self):
         pass
 
+    def sample(self):
+        """generator version of ``values``. it yields seconds to wait
+        before it is resumed, so that other work can be done meanwhile,
+        and returns the values.
+        """
+        yield from ()
+        return self.values()
+
+    def cached(self):
+        """returns whether the last sample returned the reading of an\
+        earlier one because the sensor has not seen a change, so that it\
+        is not recorded again
+        """
+        return False
+
     def __getitem__(self, attr):
         if attr in self.attributes():
             return getattr(self, attr)
@@ -93,6 +186,9 @@ class BME280(I2CSensorBase):
     https://ae-bst.resource.bosch.com/media/_tech/media/datasheets/BST-BME280_DS001-11.pdf
 
     :param i2c_addr_: I2C address
+    :param bus_: bus number or SMBus compatible object
+    :param register_shadow_: keep control registers in memory to skip\
+    reads and unchanged writes
     """
 
     oversampling_bits_map = util.BidirectionalMultiDict((
@@ -109,35 +205,96 @@ class BME280(I2CSensorBase):
         (0, 0), (2, 1), (4, 2), (8, 3), (16, 4), (16, 5), (16, 6), (16, 7)
     ))
 
-    def __init__(self, i2c_addr_):
-        super(BME280, self).__init__(i2c_addr_)
-        self.__init_cal()
-
-    def __init_cal(self):
-        self.__cal = {}
-        self.__cal['dig_T1'] = self.read_address_twobyte(0x88)
-        self.__cal['dig_T2'] = self.read_address_signed16(0x8A)
-        self.__cal['dig_T3'] = self.read_address_signed16(0x8C)
-        self.__cal['dig_P1'] = self.read_address_twobyte(0x8E)
-        self.__cal['dig_P2'] = self.read_address_signed16(0x90)
-        self.__cal['dig_P3'] = self.read_address_signed16(0x92)
-        self.__cal['dig_P4'] = self.read_address_signed16(0x94)
-        self.__cal['dig_P5'] = self.read_address_signed16(0x96)
-        self.__cal['dig_P6'] = self.read_address_signed16(0x98)
-        self.__cal['dig_P7'] = self.read_address_signed16(0x9A)
-        self.__cal['dig_P8'] = self.read_address_signed16(0x9C)
-        self.__cal['dig_P9'] = self.read_address_signed16(0x9E)
-        self.__cal['dig_H1'] = self.read_address_single(0xA1)
-        self.__cal['dig_H2'] = self.read_address_signed16(0xE1)
-        self.__cal['dig_H3'] = self.read_address_single(0xE3)
-        self.__cal['dig_H4'] = util.uint16_to_signed16(
-            (self.read_address_single(0xE4) << 4) +
-            (self.read_address_single(0xE5) & 0x0F)
-        )
-        self.__cal['dig_H5'] = util.uint16_to_signed16(
-            self.read_address_twobyte(0xE5) >> 4
-        )
-        self.__cal['dig_H6'] = self.read_address_signed8(0xE7)
+    shadow_registers = frozenset((0xF2, 0xF4, 0xF5))
+
+    def __init__(
+        self, i2c_addr_, bus_=1, calibration_=None, calibration_cache_=None,
+        register_shadow_=False
+    ):
+        super(BME280, self).__init__(i2c_addr_, bus_, register_shadow_)
+        self.__control = {}
+        self.__mode = None
+        self.__measurement_time = None
+        if calibration_ is not None:
+            self.__cal = OrderedDict(calibration_)
+        else:
+            self.__init_cal(calibration_cache_)
+
+    def __init_cal(self, calibration_cache_=None):
+        if calibration_cache_ is None:
+            self.__cal = self.decode_calibration(*self.read_calibration())
+            return
+        cache = CalibrationCache(calibration_cache_)
+        key = cache.key(self.bus_num, self.i2c_addr, self.get_chip_id())
+        banks = cache.get(key)
+        if banks is None:
+            banks = self.read_calibration()
+            cache.put(key, banks)
+        self.__cal = self.decode_calibration(*banks)
+
+    def get_chip_id(self):
+        return self.read_address_single(0xD0)
+
+    def write_address_single(self, addr_, datum_):
+        super(BME280, self).write_address_single(addr_, datum_)
+        self.__remember_control(addr_, datum_)
+
+    def store_register_shadow(self, addr_, datum_):
+        super(BME280, self).store_register_shadow(addr_, datum_)
+        self.__remember_control(addr_, datum_)
+
+    def __remember_control(self, addr_, datum_):
+        if addr_ in self.shadow_registers:
+            self.__control[addr_] = datum_
+
+    def recover(self):
+        """open the bus again and restore the control registers, which a\
+        power-on reset of the sensor clears
+        """
+        super(BME280, self).recover()
+        with self.transaction():
+            current = self.__read_control_registers()
+            if all(current[a] == v for (a, v) in self.__control.items()):
+                return
+            writes = []
+            if current[0xF4] & 0x03 != 0:
+                writes.append((0xF4, current[0xF4] & 0xFC))
+            for addr in (0xF2, 0xF5, 0xF4):
+                writes.append((addr, self.__control.get(addr, current[addr])))
+            self.write_registers(writes)
+
+    def read_calibration(self):
+        """returns raw calibration banks ``(0x88-0xA1, 0xE1-0xE7)``
+        """
+        with self.transaction():
+            return (
+                bytes(self.read_address(0x88, 26)),
+                bytes(self.read_address(0xE1, 7))
+            )
+
+    def get_calibration(self):
+        return OrderedDict(self.__cal)
+
+    @staticmethod
+    def decode_calibration(bank1_, bank2_):
+        """decode trimming parameters from the raw calibration registers
+
+        :param bank1_: 26 bytes read from ``0x88`` to ``0xA1``
+        :param bank2_: 7 bytes read from ``0xE1`` to ``0xE7``
+        """
+        cal = OrderedDict(zip(
+            (
+                'dig_T1', 'dig_T2', 'dig_T3', 'dig_P1', 'dig_P2', 'dig_P3',
+                'dig_P4', 'dig_P5', 'dig_P6', 'dig_P7', 'dig_P8', 'dig_P9'
+            ),
+            struct.unpack_from('<HhhHhhhhhhhh', bank1_, 0)
+        ))
+        cal['dig_H1'] = bank1_[25]
+        (cal['dig_H2'], cal['dig_H3'], e4, e5, e6, cal['dig_H6']) = \
+            struct.unpack_from('<hBbBbb', bank2_, 0)
+        cal['dig_H4'] = (e4 << 4) | (e5 & 0x0F)
+        cal['dig_H5'] = (e6 << 4) | (e5 >> 4)
+        return cal
 
     def __get_oversampling(self, addr_, offset_):
         d = self.read_bits(addr_, offset_, 3)
@@ -156,6 +313,7 @@ class BME280(I2CSensorBase):
         if value_ not in self.oversampling_bits_map:
             raise ValueError(value_)
         self.write_bits(addr_, self.oversampling_bits_map[value_], offset_, 3)
+        self.__measurement_time = None
 
     def set_humidity_oversampling(self, value_):
         """set oversampling of humidity data
@@ -192,7 +350,74 @@ class BME280(I2CSensorBase):
         """
         if mode_ not in self.mode_bits_map:
             raise ValueError(mode_)
-        self.write_bits(0xF4, self.mode_bits_map[mode_], 0, 2)
+        with self.transaction():
+            self.write_bits(0xF4, self.mode_bits_map[mode_], 0, 2)
+            self.__set_configured_mode(mode_)
+
+    def __set_configured_mode(self, mode_):
+        self.__mode = mode_
+        if mode_ == 'forced':
+            # the sensor returns to sleep mode after a forced measurement
+            self.store_register_shadow(
+                0xF4, self.read_address_single(0xF4) & 0xFC
+            )
+
+    def get_measurement_time(self, typical_=False):
+        """returns measurement time in ms for the current oversampling
+        settings (datasheet appendix B)
+
+        :param typical_: returns the typical time instead of the maximum
+        """
+        if self.__measurement_time is None:
+            typ = 1.0
+            max_ = 1.25
+            with self.transaction():
+                for (osrs, extra) in (
+                    (self.get_temperature_oversampling(), 0),
+                    (self.get_pressure_oversampling(), 0.5),
+                    (self.get_humidity_oversampling(), 0.5)
+                ):
+                    if osrs > 0:
+                        typ += 2 * osrs + extra
+                        max_ += 2.3 * osrs + extra * 1.15
+            self.__measurement_time = (typ, max_)
+        return self.__measurement_time[0 if typical_ else 1]
+
+    def is_measuring(self):
+        return self.read_address_single(0xF3) & 0x08 != 0
+
+    def trigger_measurement(self):
+        """start a measurement in forced mode
+        """
+        with self.transaction():
+            ctrl_meas = self.read_address_single(0xF4) & 0xFC
+            self.write_registers(
+                ((0xF4, ctrl_meas | self.mode_bits_map['forced']), )
+            )
+            self.store_register_shadow(0xF4, ctrl_meas)
+
+    def measure(self, timeout_=None):
+        """trigger a forced measurement and wait for its completion. the
+        status register is polled once the typical measurement time has
+        passed.
+
+        :param timeout_: seconds to give up polling after. twice the\
+        maximum measurement time if ``None``
+        """
+        util.drive(self.measurement(timeout_))
+
+    def measurement(self, timeout_=None):
+        """generator version of ``measure``
+        """
+        if timeout_ is None:
+            timeout_ = self.get_measurement_time() * 0.002
+        self.trigger_measurement()
+        start = monotonic()
+        yield self.get_measurement_time(typical_=True) * 0.001
+        while self.is_measuring():
+            if monotonic() - start > timeout_:
+                raise TimeoutError('BME280 measurement did not complete')
+            yield 0.001
 
     def get_inactive_duration(self):
         d = self.read_bits(0xF5, 5, 3)
@@ -224,6 +449,85 @@ class BME280(I2CSensorBase):
             raise ValueError(value_)
         self.write_bits(0xF5, self.filter_bits_map[value_], 2, 3)
 
+    def configure(
+        self, mode_=None, filter_=None, humidity_oversampling_=None,
+        pressure_oversampling_=None, temperature_oversampling_=None,
+        inactive_duration_=None
+    ):
+        """set several parameters at once. ``ctrl_hum``, ``config`` and
+        ``ctrl_meas`` are computed in memory and written in a single burst;
+        ``ctrl_meas`` comes last so that ``ctrl_hum`` takes effect. Omitted
+        parameters are kept as they are.
+
+        :param mode_: see ``set_mode``
+        :param filter_: see ``set_filter``
+        :param humidity_oversampling_: see ``set_humidity_oversampling``
+        :param pressure_oversampling_: see ``set_pressure_oversampling``
+        :param temperature_oversampling_: see\
+        ``set_temperature_oversampling``
+        :param inactive_duration_: see ``set_inactive_duration``
+        """
+        fields = (
+            (0xF2, 0, 3, self.oversampling_bits_map, humidity_oversampling_),
+            (0xF4, 5, 3, self.oversampling_bits_map,
+             temperature_oversampling_),
+            (0xF4, 2, 3, self.oversampling_bits_map, pressure_oversampling_),
+            (0xF4, 0, 2, self.mode_bits_map, mode_),
+            (0xF5, 5, 3, self.inactivedurationms_bits_map,
+             inactive_duration_),
+            (0xF5, 2, 3, self.filter_bits_map, filter_)
+        )
+        for (_, _, _, bits_map, value) in fields:
+            if value is not None and value not in bits_map:
+                raise ValueError(value)
+        with self.transaction():
+            current = self.__read_control_registers()
+            regs = dict(current)
+            for (addr, offset, length, bits_map, value) in fields:
+                if value is not None:
+                    regs[addr] = util.replace_bits(
+                        regs[addr], bits_map[value], offset, length
+                    )
+            writes = []
+            if regs[0xF5] != current[0xF5] and current[0xF4] & 0x03 != 0:
+                # config is ignored unless the sensor sleeps
+                writes.append((0xF4, current[0xF4] & 0xFC))
+            if regs[0xF2] != current[0xF2]:
+                writes.append((0xF2, regs[0xF2]))
+            if regs[0xF5] != current[0xF5]:
+                writes.append((0xF5, regs[0xF5]))
+            if len(writes) > 0 or regs[0xF4] != current[0xF4]:
+                writes.append((0xF4, regs[0xF4]))
+            self.write_registers(writes)
+            if mode_ is not None:
+                self.__set_configured_mode(mode_)
+        if humidity_oversampling_ is not None or \
+                pressure_oversampling_ is not None or \
+                temperature_oversampling_ is not None:
+            self.__measurement_time = None
+
+    def __read_control_registers(self):
+        if self.register_shadow:
+            return dict(
+                (a, self.read_address_single(a)) for a in (0xF2, 0xF4, 0xF5)
+            )
+        data = self.read_address(0xF2, 4)
+        return {0xF2: data[0], 0xF4: data[2], 0xF5: data[3]}
+
+    def write_registers(self, writes_):
+        """write registers in a single burst
+
+        :param writes_: sequence of ``(address, value)`` written in order
+        """
+        if len(writes_) == 0:
+            return
+        data = [writes_[0][1]]
+        for (addr, value) in writes_[1:]:
+            data.extend((addr, value))
+        self.write_address(writes_[0][0], data)
+        for (addr, value) in writes_:
+            self.store_register_shadow(addr, value)
+
     def print_cal(self):
         for k, v in sorted(self.__cal.items(), key=lambda x: x[0]):
             print(' {} : {}'.format(k, v))
@@ -299,6 +603,74 @@ class BME280(I2CSensorBase):
             v_x1_u32r = 419430400
         return (v_x1_u32r >> 12) / 1024
 
+    def compensate_batch(self, adc_p_, adc_t_, adc_h_):
+        """compensate many raw samples at once with NumPy. the results are\
+        bit-exact with ``get_pressure``, ``get_temperature`` and\
+        ``get_humidity``
+
+        :param adc_p_: array of raw pressure
+        :param adc_t_: array of raw temperature
+        :param adc_h_: array of raw humidity
+        :returns: ``(pressure, temperature, humidity)`` as float64 arrays
+        """
+        if numpy is None:
+            raise ImportError('numpy is required for batch compensation')
+        cal = dict((k, numpy.int64(v)) for (k, v) in self.__cal.items())
+        adc_p = numpy.asarray(adc_p_, dtype=numpy.int64)
+        adc_t = numpy.asarray(adc_t_, dtype=numpy.int64)
+        adc_h = numpy.asarray(adc_h_, dtype=numpy.int64)
+
+        t_fine = ((
+            ((adc_t >> 3) - (cal['dig_T1'] << 1)) * cal['dig_T2']
+        ) >> 11) + ((((
+            ((adc_t >> 4) - cal['dig_T1']) * ((adc_t >> 4) - cal['dig_T1'])
+        ) >> 12) * cal['dig_T3']) >> 14)
+        temperature = ((t_fine * 5 + 128) >> 8) * 0.01
+
+        var1 = t_fine - 128000
+        var2 = var1 * var1 * cal['dig_P6']
+        var2 = var2 + ((var1 * cal['dig_P5']) << 17)
+        var2 = var2 + (cal['dig_P4'] << 35)
+        var1 = ((var1 * var1 * cal['dig_P3']) >> 8) + \
+            ((var1 * cal['dig_P2']) << 12)
+        # ((1 << 47) + var1) * dig_P1 >> 33 without overflowing int64
+        a = (1 << 47) + var1
+        var1 = (
+            (a >> 16) * cal['dig_P1'] + (((a & 0xFFFF) * cal['dig_P1']) >> 16)
+        ) >> 17
+        valid = var1 != 0
+        divisor = numpy.where(valid, var1, 1)
+        # (n * 3125) // divisor as 3125 * q + (3125 * r) // divisor
+        n = ((1048576 - adc_p) << 31) - var2
+        (q, r) = (n // divisor, n % divisor)
+        # samples whose pressure would overflow int64 below are done in
+        # Python integers
+        exact = valid & (numpy.abs(q) < (1 << 36) // 3125)
+        q = numpy.where(exact, q, 0)
+        p = 3125 * q + (3125 * r) // divisor
+        var1 = (cal['dig_P9'] * (p >> 13) * (p >> 13)) >> 25
+        var2 = (cal['dig_P8'] * p) >> 19
+        p = ((p + var1 + var2) >> 8) + (cal['dig_P7'] << 4)
+        pressure = numpy.where(valid, p / 25600, 0.0)
+        for i in numpy.flatnonzero(valid & ~exact):
+            pressure[i] = self.get_pressure(int(t_fine[i]), int(adc_p[i]))
+
+        v_x1_u32r = t_fine - 76800
+        v_x1_u32r = ((((
+            (adc_h << 14) - (cal['dig_H4'] << 20) -
+            (cal['dig_H5'] * v_x1_u32r)
+        ) + 16384) >> 15) * (((((
+            ((v_x1_u32r * cal['dig_H6']) >> 10) *
+            (((v_x1_u32r * cal['dig_H3']) >> 11) + 32768)
+        ) >> 10) + 2097152) * cal['dig_H2'] + 8192) >> 14))
+        v_x1_u32r = v_x1_u32r - (((
+            ((v_x1_u32r >> 15) * (v_x1_u32r >> 15)) >> 7
+        ) * cal['dig_H1']) >> 4)
+        v_x1_u32r = numpy.clip(v_x1_u32r, 0, 419430400)
+        humidity = (v_x1_u32r >> 12) / 1024
+
+        return (pressure, temperature, humidity)
+
     @property
     def temperature(self):
         return self.get_temperature()
@@ -323,6 +695,11 @@ class BME280(I2CSensorBase):
         return ('pressure', 'temperature', 'humidity')
 
     def values(self):
+        return util.drive(self.sample())
+
+    def sample(self):
+        if self.__mode == 'forced':
+            yield from self.measurement()
         (adc_p, adc_t, adc_h) = self.get_adc()
         t_fine = self.get_t_fine(adc_t)
         return (
@@ -332,11 +709,65 @@ class BME280(I2CSensorBase):
         )
 
 
+class CalibrationCache(object):
+    """JSON file which keeps raw calibration banks across restarts.
+
+    A file or an entry which cannot be decoded into banks of the expected
+    sizes is ignored, so the calibration is read from the sensor again.
+
+    :param path_: path to the cache file
+    """
+
+    bank_sizes = (26, 7)
+
+    def __init__(self, path_):
+        super(CalibrationCache, self).__init__()
+        self.__path = path_
+
+    @staticmethod
+    def key(bus_num_, i2c_addr_, chip_id_):
+        return '{}:0x{:02x}:0x{:02x}'.format(bus_num_, i2c_addr_, chip_id_)
+
+    def load(self):
+        try:
+            with open(self.__path, 'r') as fin:
+                entries = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def get(self, key_):
+        entry = self.load().get(key_)
+        if not isinstance(entry, list):
+            return None
+        try:
+            banks = tuple(bytes.fromhex(d) for d in entry)
+        except (TypeError, ValueError):
+            return None
+        if tuple(len(b) for b in banks) != self.bank_sizes:
+            return None
+        return banks
+
+    def put(self, key_, banks_):
+        entries = self.load()
+        entries[key_] = [bytes(d).hex() for d in banks_]
+        tmp = '{}.tmp'.format(self.__path)
+        try:
+            with open(tmp, 'w') as fout:
+                json.dump(entries, fout, indent=2, sort_keys=True)
+            os.replace(tmp, self.__path)
+        except OSError:
+            pass
+
+
 class TSL2561(I2CSensorBase):
     """Python driver for TSL2561.
     https://cdn-shop.adafruit.com/datasheets/TSL2561.pdf
 
     :param i2c_addr_: I2C address
+    :param bus_: bus number or SMBus compatible object
+    :param register_shadow_: keep control registers in memory to skip\
+    reads and unchanged writes
     """
 
     gain_bits_map = util.BidirectionalMultiDict((
@@ -345,9 +776,18 @@ class TSL2561(I2CSensorBase):
     time_bits_map = util.BidirectionalMultiDict((
         (13.7, 0), (101, 1), (402, 2)
     ))
+    saturation_map = {13.7: 5047, 101: 37177, 402: 65535}
+    ranges = ((1, 13.7), (1, 101), (16, 101), (16, 402))
+    default_range = (16, 101)
 
-    def __init__(self, i2c_addr_):
-        super(TSL2561, self).__init__(i2c_addr_)
+    shadow_registers = frozenset((0x00, 0x01))
+
+    def __init__(self, i2c_addr_, bus_=1, register_shadow_=False):
+        super(TSL2561, self).__init__(i2c_addr_, bus_, register_shadow_)
+        self.auto_range = util.AutoRange(
+            ((g, t, self.saturation_map[t]) for (g, t) in self.ranges),
+            self.default_range
+        )
 
     def read_address(self, addr_, length_):
         return super(TSL2561, self).read_address(
@@ -363,6 +803,10 @@ class TSL2561(I2CSensorBase):
     def values(self):
         return (self.get_illuminance(), )
 
+    def sample(self):
+        (adc, params) = yield from self.adc_sampling()
+        return (self.get_illuminance(adc, params), )
+
     def get_illuminance(self, adc=None, params=None):
         if adc is None:
             return self.get_illuminance(*self.get_adc())
@@ -385,34 +829,43 @@ class TSL2561(I2CSensorBase):
         return lux * 16 / params[0] * 402 / params[1]
 
     def integrate(self, gain, time):
-        self.power_off()
-        self.set_params(gain, time)
-        self.power_on()
-        sleep(time * 0.0011)
-        data = self.read_address(0xC, 4)
-        self.power_off()
+        return util.drive(self.integration(gain, time))
+
+    def integration(self, gain, time):
+        """generator version of ``integrate``
+        """
+        with self.transaction():
+            self.power_off()
+            self.set_params(gain, time)
+            self.power_on()
+        yield time * 0.0011
+        with self.transaction():
+            data = self.read_address(0xC, 4)
+            self.power_off()
         return ((data[1] << 8) | data[0], (data[3] << 8) | data[2])
 
     def get_adc(self):
-        gain = 16
-        time = 101
+        return util.drive(self.adc_sampling())
 
-        while True:
-            buf = self.integrate(gain, time)
-            if buf[0] > 37000 or buf[1] > 37000:
-                if gain == 16 and time == 101:
-                    gain = 1
-                else:
-                    break
-            elif buf[0] < 300 or buf[1] < 300:
-                if gain == 16 and time == 101:
-                    time = 402
-                else:
-                    break
-            else:
+    def adc_sampling(self):
+        """generator version of ``get_adc``. the range is predicted by\
+        ``auto_range``
+        """
+        index = self.auto_range.predict()
+        for _ in self.auto_range.ranges:
+            measured = index
+            (gain, time, _) = self.auto_range.ranges[measured]
+            buf = yield from self.integration(gain, time)
+            index = self.auto_range.retry(measured, max(buf))
+            if index is None:
                 break
+        self.auto_range.update(measured, max(buf))
         return (buf, (gain, time))
 
+    def recover(self):
+        super(TSL2561, self).recover()
+        self.power_off()
+
     def is_on(self):
         return self.read_address_single(0) != 0
 
@@ -438,10 +891,12 @@ class TSL2561(I2CSensorBase):
         )
 
     def set_gain(self, gain):
-        self.set_params(gain, self.get_time())
+        with self.transaction():
+            self.set_params(gain, self.get_time())
 
     def set_time(self, time_):
-        self.set_params(self.get_gain(), time_)
+        with self.transaction():
+            self.set_params(self.get_gain(), time_)
 
     def set_params(self, gain, time_):
         """set gain and time simultaneously.
@@ -461,7 +916,16 @@ class TSL2561(I2CSensorBase):
 class TSL2572(I2CSensorBase):
     """Python driver for TSL2572.
 
+    By default each sample is a one-shot integration. After
+    ``start_continuous()`` the ALS keeps running with its threshold
+    interrupt armed around the last reading, and a sample only reads the
+    status register unless a threshold has been crossed or the reading has
+    become too old.
+
     :param i2c_addr_: I2C address
+    :param bus_: bus number or SMBus compatible object
+    :param register_shadow_: keep control registers in memory to skip\
+    reads and unchanged writes
     """
 
     gain_bits_map = util.BidirectionalMultiDict((
@@ -471,9 +935,33 @@ class TSL2572(I2CSensorBase):
     time_bits_map = util.BidirectionalMultiDict((
         (50, 0xED), (200, 0xB6), (600, 0x24)
     ))
+    ranges = ((0.16, 50), (1, 200), (8, 200), (120, 200), (120, 600))
+    default_range = (1, 200)
 
-    def __init__(self, i2c_addr_):
-        super(TSL2572, self).__init__(i2c_addr_)
+    shadow_registers = frozenset((0x00, 0x01, 0x0D, 0x0F))
+
+    timeout_factor = 2.0
+    timeout_margin = 0.05
+    min_poll_interval = 0.001
+
+    def __init__(self, i2c_addr_, bus_=1, register_shadow_=False):
+        super(TSL2572, self).__init__(i2c_addr_, bus_, register_shadow_)
+        self.auto_range = util.AutoRange(
+            ((g, t, self.saturation(t)) for (g, t) in self.ranges),
+            self.default_range
+        )
+        self.__continuous = None
+        self.__continuous_range = None
+        self.__continuous_adc = None
+        self.__continuous_expires = 0.0
+        self.__continuous_started = 0.0
+        self.__cached = False
+
+    @classmethod
+    def saturation(cls, time_):
+        """returns the maximum count at integration time ``time_``
+        """
+        return min(65535, 1024 * (256 - cls.time_bits_map[time_]))
 
     def read_address(self, addr_, length_):
         return super(TSL2572, self).read_address(
@@ -489,6 +977,10 @@ class TSL2572(I2CSensorBase):
     def values(self):
         return (self.get_illuminance(), )
 
+    def sample(self):
+        (adc, params) = yield from self.adc_sampling()
+        return (self.get_illuminance(adc, params), )
+
     def get_illuminance(self, adc=None, params=None):
         if adc is None:
             return self.get_illuminance(*self.get_adc())
@@ -501,47 +993,208 @@ class TSL2572(I2CSensorBase):
         lux2 = (0.63 * adc[0] - adc[1]) / cpl
         return max([0, lux1, lux2])
 
-    def is_valid(self):
+    def is_valid(self, interrupt_=True):
+        """returns whether an integration has completed
+
+        :param interrupt_: also require ``AINT``, which a one-shot\
+        integration with the default thresholds raises
+        """
         d = self.read_address_single(0x13)
-        return (d & 0x01 == 1) and (((d & 0x10) >> 4) == 1)
+        return (d & 0x01 == 1) and \
+            (not interrupt_ or ((d & 0x10) >> 4) == 1)
+
+    def completion(self, time_, started_=None, interrupt_=True):
+        """generator which waits for the integration of ``time_`` ms started\
+        at ``started_`` (``monotonic()``, now if ``None``)
+
+        It sleeps until the expected completion and then polls the status\
+        with a doubling interval. If the integration has not completed\
+        after ``timeout_factor`` integration times plus\
+        ``timeout_margin``, the sensor is re-initialized and\
+        ``TimeoutError`` is raised.
+        """
+        now = monotonic()
+        started = now if started_ is None else started_
+        expected = time_ * 0.0011
+        deadline = max(started + expected, now) + \
+            (self.timeout_factor - 1) * expected + self.timeout_margin
+        if started + expected > now:
+            yield started + expected - now
+        interval = max(self.min_poll_interval, expected * 0.02)
+        while not self.is_valid(interrupt_):
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                self.reinitialize()
+                raise TimeoutError(
+                    'TSL2572 at {:#x} did not complete an integration'.format(
+                        self.i2c_addr
+                    )
+                )
+            yield min(interval, remaining)
+            interval = min(interval * 2, expected * 0.25)
+
+    def recover(self):
+        super(TSL2572, self).recover()
+        self.reinitialize()
+
+    def reinitialize(self):
+        """put the sensor back to a known state after a failure. the\
+        continuous mode is restarted on the next sample
+        """
+        self.clear_register_shadow()
+        self.__continuous_range = None
+        with self.transaction():
+            self.sleep()
+            self.set_thresholds(0, 0)
+            self.set_persistence(0)
+            self.clear_interrupt()
 
     def integrate(self, gain, time):
-        self.power_off()
-        self.set_params(gain, time)
-        self.power_on()
-        sleep(time * 0.0011)
-        while True:
-            if self.is_valid():
-                break
-            sleep(0.01)
-        self.power_off()
-        data = self.read_address(0x14, 4)
+        return util.drive(self.integration(gain, time))
+
+    def integration(self, gain, time):
+        """generator version of ``integrate``
+        """
+        with self.transaction():
+            self.power_off()
+            self.set_params(gain, time)
+            self.power_on()
+        yield from self.completion(time)
+        with self.transaction():
+            self.power_off()
+            data = self.read_address(0x14, 4)
         return ((data[1] << 8) | data[0], (data[3] << 8) | data[2])
 
     def get_adc(self):
-        gain = 1
-        time = 200
-
-        buf = self.integrate(gain, time)
-        if max(buf) == 65535:
-            gain = 0.16
-            time = 50
-            buf = self.integrate(gain, time)
-        elif max(buf) < 100:
-            gain = 120
-            time = 600
-            buf = self.integrate(gain, time)
-        elif max(buf) < 300 :
-            gain = 120
-            time = 200
-            buf = self.integrate(gain, time)
-        elif max(buf) < 3000:
-            gain = 8
-            time = 200
-            buf = self.integrate(gain, time)
+        return util.drive(self.adc_sampling())
+
+    def adc_sampling(self):
+        """generator version of ``get_adc``. the range is predicted by\
+        ``auto_range``
+        """
+        self.__cached = False
+        if self.__continuous is not None:
+            return (yield from self.continuous_sampling())
+        index = self.auto_range.predict()
+        for _ in self.auto_range.ranges:
+            measured = index
+            (gain, time, _) = self.auto_range.ranges[measured]
+            buf = yield from self.integration(gain, time)
+            index = self.auto_range.retry(measured, max(buf))
+            if index is None:
+                break
+        self.auto_range.update(measured, max(buf))
         self.sleep()
         return (buf, (gain, time))
 
+    @property
+    def continuous(self):
+        return self.__continuous is not None
+
+    def start_continuous(self, threshold_=0.1, persistence_=2, max_age_=60):
+        """switch to continuous sampling. the ALS is started on the next\
+        sample
+
+        :param threshold_: half width of the interrupt window relative to\
+        the last reading of channel 0
+        :param persistence_: ``APERS`` value (0-15), i.e. how many\
+        consecutive integrations have to be outside the window
+        :param max_age_: seconds after which the ADC is read even if no\
+        threshold has been crossed
+        """
+        if persistence_ < 0 or persistence_ > 15:
+            raise ValueError(persistence_)
+        self.__continuous = (threshold_, persistence_, max_age_)
+        self.__continuous_range = None
+        self.__continuous_adc = None
+
+    def stop_continuous(self):
+        """switch back to one-shot integrations
+        """
+        if self.__continuous is None:
+            return
+        self.__continuous = None
+        with self.transaction():
+            self.power_off()
+            self.set_thresholds(0, 0)
+            self.set_persistence(0)
+            self.clear_interrupt()
+            self.sleep()
+
+    def set_thresholds(self, low_, high_):
+        """set the ALS interrupt thresholds of channel 0
+        """
+        self.write_address(0x04, list(struct.pack('<HH', low_, high_)))
+
+    def set_persistence(self, value_):
+        """set the number of consecutive out-of-threshold integrations\
+        which raise ``AINT``. a one-shot integration needs 0, which raises\
+        it after every integration
+        """
+        self.write_address_single(0x0C, value_ & 0x0F)
+
+    def clear_interrupt(self):
+        """ALS interrupt clear special function
+        """
+        self.write_command(0xE6)
+
+    def is_interrupted(self):
+        return self.read_address_single(0x13) & 0x10 == 0x10
+
+    def __start_continuous(self, index_):
+        (gain, time, _) = self.auto_range.ranges[index_]
+        with self.transaction():
+            self.power_off()
+            self.set_params(gain, time)
+            self.set_thresholds(0xFFFF, 0)
+            self.set_persistence(self.__continuous[1])
+            self.clear_interrupt()
+            self.write_address_single(0x00, 0x13)
+        self.__continuous_range = index_
+        self.__continuous_started = monotonic()
+
+    def cached(self):
+        return self.__cached
+
+    def continuous_sampling(self):
+        """generator version of ``get_adc`` in continuous mode. the last\
+        reading is returned without reading the ADC while it is within the\
+        thresholds and younger than ``max_age_``
+        """
+        (threshold, _, max_age) = self.__continuous
+        if self.__continuous_range is None:
+            self.__start_continuous(self.auto_range.predict())
+        elif monotonic() < self.__continuous_expires and \
+                not self.is_interrupted():
+            self.__cached = True
+            return self.__continuous_adc
+        for _ in self.auto_range.ranges:
+            index = self.__continuous_range
+            yield from self.completion(
+                self.auto_range.ranges[index][1], self.__continuous_started,
+                False
+            )
+            data = self.read_address(0x14, 4)
+            buf = ((data[1] << 8) | data[0], (data[3] << 8) | data[2])
+            retry = self.auto_range.retry(index, max(buf))
+            if retry is None:
+                break
+            self.__start_continuous(retry)
+        self.auto_range.update(index, max(buf))
+        width = max(int(buf[0] * threshold), 1)
+        if self.__continuous_range != index:
+            # out of retries: the thresholds are for the range read last
+            self.__start_continuous(index)
+        with self.transaction():
+            self.set_thresholds(
+                max(0, buf[0] - width), min(0xFFFF, buf[0] + width)
+            )
+            self.clear_interrupt()
+        (gain, time, _) = self.auto_range.ranges[index]
+        self.__continuous_adc = (buf, (gain, time))
+        self.__continuous_expires = monotonic() + max_age
+        return self.__continuous_adc
+
     def is_on(self):
         return self.read_address_single(0) != 0x01
 
@@ -555,10 +1208,11 @@ class TSL2572(I2CSensorBase):
         self.write_address_single(0, 0x00)
 
     def get_gain(self):
-        return self.gain_bits_map.inverse[(
-            self.read_address_single(0x0D),
-            self.read_address_single(0x0F)
-        )]
+        with self.transaction():
+            return self.gain_bits_map.inverse[(
+                self.read_address_single(0x0D),
+                self.read_address_single(0x0F)
+            )]
 
     def get_time(self):
         return self.time_bits_map.inverse[self.read_address_single(0x01)]
@@ -566,20 +1220,23 @@ class TSL2572(I2CSensorBase):
     def get_params(self):
         """returns (gain, time)
         """
-        return (
-            self.get_gain(), self.get_time()
-        )
+        with self.transaction():
+            return (
+                self.get_gain(), self.get_time()
+            )
 
     def set_gain(self, gain):
-        self.write_address_single(0x0D, self.gain_bits_map[gain][0])
-        self.write_address_single(0x0F, self.gain_bits_map[gain][1])
+        with self.transaction():
+            self.write_address_single(0x0D, self.gain_bits_map[gain][0])
+            self.write_address_single(0x0F, self.gain_bits_map[gain][1])
 
     def set_time(self, time_):
         self.write_address_single(0x01, self.time_bits_map[time_])
 
     def set_params(self, gain, time_):
-        self.set_time(time_)
-        self.set_gain(gain)
+        with self.transaction():
+            self.set_time(time_)
+            self.set_gain(gain)
 
     @property
     def illuminance(self):
@@ -587,8 +1244,8 @@ class TSL2572(I2CSensorBase):
 
 
 class ThreadedTSL2561(TSL2561, Thread):
-    def __init__(self, i2c_addr_):
-        TSL2561.__init__(self, i2c_addr_)
+    def __init__(self, i2c_addr_, bus_=1, register_shadow_=False):
+        TSL2561.__init__(self, i2c_addr_, bus_, register_shadow_)
         Thread.__init__(self)
         (adc, params) = super(ThreadedTSL2561, self).get_adc()
         self.__latest_value = super(ThreadedTSL2561, self).get_illuminance(
@@ -624,6 +1281,9 @@ class CompositeSensor(object):
             else:
                 raise TypeError(s)
 
+    def sensors(self):
+        return tuple(self.__sensors)
+
     def attributes(self):
         return sum(map(lambda x: x.attributes(), self.__sensors), tuple())
 
@@ -638,33 +1298,199 @@ class CompositeSensor(object):
 
 
 class ThreadedCompositeSensor(CompositeSensor, Thread):
-    def __init__(self, sensors, hook=None):
+    """Samples the sensors in the background.
+
+    Sensors are sampled by an ``InterleavedScheduler``, so a slow
+    illuminance integration does not delay the other sensors.
+
+    :param sensors: sensors to sample
+    :param hook: called with the latest values whenever a sensor has been\
+    sampled. it runs in its own thread, so a slow hook does not delay\
+    the sampling
+    :param interval: default sampling period in seconds. a BME280 in\
+    forced mode measures once per sampling, so a long period gives a low\
+    duty cycle
+    :param periods: dict of ``{sensor: period}`` to sample some sensors\
+    at their own period
+    :param history_capacity: number of samples per attribute to keep in\
+    ``history()``. no history is kept if ``None``
+    :param history_windows: window lengths in seconds whose aggregates\
+    ``history()`` maintains incrementally
+    :param history_tiers: ``(resolution, capacity)`` of the downsampled\
+    tiers ``history()`` keeps besides the raw samples
+    :param sample_log: ``SampleLog`` or ``GroupCommitWriter`` to append\
+    every sample to
+    :param history_restore: seconds of samples to load from\
+    ``sample_log`` into ``history()`` on start
+    :param hook_queue_size: number of samples queued for a hook which is\
+    behind
+    :param hook_policy: ``Subscription`` policy of the hook queue when it\
+    is full
+    :param max_backoff: maximum seconds between attempts of a sensor which\
+    keeps failing
+    :param daemon: run the sampling thread as a daemon thread, which does\
+    not keep the process alive
+    """
+
+    def __init__(
+        self, sensors, hook=None, interval=1, periods=None,
+        history_capacity=None, history_windows=(), history_tiers=(),
+        sample_log=None, history_restore=None, hook_queue_size=64,
+        hook_policy='drop_oldest', max_backoff=60, daemon=False
+    ):
         CompositeSensor.__init__(self, sensors)
-        Thread.__init__(self)
+        Thread.__init__(self, daemon=daemon)
+        self.__history = None if history_capacity is None else History(
+            CompositeSensor.attributes(self), history_capacity,
+            history_windows, history_tiers
+        )
+        self.__sample_log = sample_log
+        if self.__history is not None and sample_log is not None and \
+                history_restore is not None:
+            sample_log.restore(self.__history, time.time() - history_restore)
+        self.__scheduler = InterleavedScheduler(
+            self.sensors(), self.__update, interval, periods, max_backoff
+        )
+        self.__periods = dict(
+            (a, period)
+            for (sensor, period) in self.__scheduler.periods().items()
+            for a in sensor.attributes()
+        )
         self.__renew()
-        self.__hook = hook if hook is not None else lambda v: None
+        self.__dispatcher = Dispatcher()
+        if hook is not None:
+            self.__dispatcher.add_hook(hook, hook_queue_size, hook_policy)
         self.start()
 
     def __renew(self):
-        self.__latest_values = OrderedDict(zip(
-            super(ThreadedCompositeSensor, self).attributes(),
-            super(ThreadedCompositeSensor, self).values()
-        ))
+        attributes = tuple(super(ThreadedCompositeSensor, self).attributes())
+        values = tuple(super(ThreadedCompositeSensor, self).values())
+        timestamp = time.time()
+        self.__snapshot = Snapshot.encode(
+            1, attributes, values, (timestamp,) * len(attributes),
+            (1,) * len(attributes),
+            tuple(self.__periods[a] for a in attributes)
+        )
+        self.__record(timestamp, dict(zip(attributes, values)))
+
+    def __update(self, sensor, values):
+        if sensor.cached():
+            # the reading keeps its acquisition time and sequence number
+            return
+        timestamp = time.time()
+        previous = self.__snapshot
+        sequence = previous.sequence + 1
+        updated = dict(zip(sensor.attributes(), values))
+        snapshot = Snapshot.encode(
+            sequence, previous.attributes, tuple(
+                updated.get(a, v)
+                for (a, v) in zip(previous.attributes, previous.values)
+            ), tuple(
+                timestamp if a in updated else t
+                for (a, t) in zip(previous.attributes, previous.timestamps)
+            ), tuple(
+                sequence if a in updated else n
+                for (a, n) in zip(previous.attributes, previous.sequences)
+            ), previous.periods
+        )
+        self.__snapshot = snapshot
+        self.__record(timestamp, updated)
+        self.__dispatcher.publish(timestamp, snapshot.as_dict())
+
+    def __record(self, timestamp, values):
+        if self.__history is not None:
+            values = self.__history.record(timestamp, values)
+        if self.__sample_log is not None and len(values) > 0:
+            self.__sample_log.append(timestamp, values)
 
     def attributes(self):
-        return self.__latest_values.keys()
+        return self.__snapshot.attributes
 
     def values(self):
-        return self.__latest_values.values()
+        return self.__snapshot.values
 
     def __getitem__(self, attr):
-        if attr in self.__latest_values:
-            return self.__latest_values[attr]
-        else:
-            raise KeyError(attr)
+        return self.__snapshot.get(attr)
+
+    def sequence(self, attr=None):
+        """returns the sequence number of the latest sample, or of the\
+        latest sample of ``attr``. it increases with every sample
+        """
+        snapshot = self.__snapshot
+        if attr is None:
+            return snapshot.sequence
+        return snapshot.sequences[snapshot.index(attr)]
+
+    def timestamp(self, attr=None):
+        """returns the acquisition time of the latest sample, or of the\
+        latest sample of ``attr``
+        """
+        snapshot = self.__snapshot
+        if attr is None:
+            return snapshot.timestamp
+        return snapshot.timestamps[snapshot.index(attr)]
+
+    def period(self, attr=None):
+        """returns the sampling period of ``attr``, or the shortest one
+        """
+        if attr is None:
+            return min(self.__periods.values())
+        return self.__periods[attr]
+
+    def snapshot(self):
+        """returns ``Snapshot`` of the latest sampling cycle. values,\
+        timestamps and sequence numbers read from one snapshot are\
+        consistent with each other
+        """
+        return self.__snapshot
+
+    def health(self, tolerance=2.0):
+        """returns ``{attribute: health}`` with the age of the latest value,\
+        whether it is stale, i.e. its sensor is failing or has not completed\
+        a sample for more than ``tolerance`` periods, and the failures of\
+        its sensor. a value which the sensor keeps confirming, e.g. a\
+        TSL2572 in continuous mode, grows old without becoming stale
+        """
+        ages = self.__snapshot.ages()
+        overdue = self.__scheduler.overdue(tolerance)
+        health = OrderedDict()
+        for statistics in self.__scheduler.statistics():
+            for attr in statistics['attributes']:
+                health[attr] = {
+                    'age': ages[attr],
+                    'stale': statistics['stale'] or
+                    any(attr in s.attributes() for s in overdue),
+                    'consecutive_failures':
+                    statistics['consecutive_failures'],
+                    'last_error': statistics['last_error']
+                }
+        return health
+
+    def history(self):
+        """returns ``History`` of the sampled values or ``None``
+        """
+        return self.__history
+
+    def dispatcher(self):
+        """returns the ``Dispatcher`` which publishes the latest values\
+        whenever a sensor has been sampled
+        """
+        return self.__dispatcher
+
+    def subscribe(self, maxsize=64, policy='drop_oldest'):
+        """returns a ``Subscription`` to the latest values
+        """
+        return self.__dispatcher.subscribe(maxsize, policy)
+
+    def stop(self):
+        self.__scheduler.stop()
+        self.__dispatcher.close()
+
+    def statistics(self):
+        """returns target period, achieved rate and missed deadlines of
+        each sensor
+        """
+        return self.__scheduler.statistics()
 
     def run(self):
-        while True:
-            self.__renew()
-            self.__hook(self.__latest_values)
-            sleep(1)
+        self.__scheduler.run()
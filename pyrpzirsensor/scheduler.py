@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+from heapq import heappush, heappop
+from math import ceil
+from threading import Event
+from time import monotonic
+
+
+class ScheduledSensor(object):
+    """Sampling state of a sensor in ``InterleavedScheduler``.
+
+    Deadlines are ``first deadline + n * period`` on the monotonic clock,
+    so the time spent sampling does not make the period drift. Deadlines
+    which have already passed when a sample completes are skipped and
+    counted as missed.
+
+    A sample which raises an exception (``OSError`` and ``TimeoutError``
+    from the bus, or anything else from the driver) is abandoned and the
+    sensor is marked stale until a sample succeeds. The next attempt is
+    delayed by ``period * 2 ** (failures - 1)``, at most ``max_backoff``
+    seconds, and starts with ``sensor.recover()``. Exceptions raised by the
+    callback which consumes the values are counted separately.
+
+    :param sensor: sensor to sample
+    :param period: target seconds between the starts of two samples
+    :param max_backoff: maximum seconds between attempts of a failing\
+    sensor
+    """
+
+    smoothing = 0.1
+
+    def __init__(self, sensor, period, max_backoff=60):
+        super(ScheduledSensor, self).__init__()
+        self.sensor = sensor
+        self.period = period
+        self.max_backoff = max_backoff
+        self.deadline = monotonic()
+        self.completed = self.deadline
+        self.generator = None
+        self.samples = 0
+        self.missed = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.failures = 0
+        self.last_error = None
+        self.callback_errors = 0
+        self.last_callback_error = None
+        self.stale = False
+        self.started = None
+        self.mean_interval = None
+        self.last_duration = None
+
+    def start(self, now_):
+        if self.started is not None:
+            interval = now_ - self.started
+            if self.mean_interval is None:
+                self.mean_interval = interval
+            else:
+                self.mean_interval += \
+                    (interval - self.mean_interval) * self.smoothing
+        self.started = now_
+        if self.failures > 0:
+            self.sensor.recover()
+        self.generator = self.sensor.sample()
+
+    def complete(self, now_):
+        self.samples += 1
+        self.failures = 0
+        self.stale = False
+        self.completed = now_
+        self.__advance(now_, now_)
+
+    def fail(self, now_, error_):
+        if isinstance(error_, TimeoutError):
+            self.timeouts += 1
+        else:
+            self.errors += 1
+        self.failures += 1
+        self.last_error = self.describe(error_)
+        self.stale = True
+        self.__advance(now_, now_ + self.backoff())
+
+    def callback_failed(self, error_):
+        self.callback_errors += 1
+        self.last_callback_error = self.describe(error_)
+
+    @staticmethod
+    def describe(error_):
+        return '{}: {}'.format(type(error_).__name__, error_)
+
+    def backoff(self):
+        """returns seconds to wait before the next attempt
+        """
+        if self.failures == 0:
+            return 0.0
+        return min(
+            self.period * 2 ** min(self.failures - 1, 32), self.max_backoff
+        )
+
+    def __advance(self, now_, earliest_):
+        self.generator = None
+        self.last_duration = now_ - self.started
+        self.deadline += self.period
+        if self.deadline < earliest_:
+            skipped = int(ceil((earliest_ - self.deadline) / self.period))
+            self.missed += skipped
+            self.deadline += skipped * self.period
+
+    def overdue(self, tolerance_, now_):
+        """returns whether no sample has completed for more than\
+        ``tolerance_`` periods
+        """
+        return now_ - self.completed > tolerance_ * self.period
+
+    def rate(self):
+        """returns achieved samples per second
+        """
+        if self.mean_interval is None or self.mean_interval <= 0:
+            return None
+        return 1.0 / self.mean_interval
+
+    def statistics(self):
+        return {
+            'attributes': list(self.sensor.attributes()),
+            'period': self.period,
+            'rate': self.rate(),
+            'samples': self.samples,
+            'missed_deadlines': self.missed,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'consecutive_failures': self.failures,
+            'last_error': self.last_error,
+            'callback_errors': self.callback_errors,
+            'last_callback_error': self.last_callback_error,
+            'stale': self.stale,
+            'last_duration': self.last_duration
+        }
+
+
+class InterleavedScheduler(object):
+    """Runs ``sample()`` generators of several sensors in one thread.
+
+    While a sensor waits for its integration, the other sensors are
+    sampled, so each sensor is refreshed at its own period.
+
+    :param sensors: sensors to sample
+    :param callback: called with ``(sensor, values)`` when a sensor has\
+    been sampled
+    :param interval: default period in seconds
+    :param periods: dict of ``{sensor: period}`` overriding ``interval``
+    :param max_backoff: maximum seconds between attempts of a failing\
+    sensor
+    """
+
+    def __init__(
+        self, sensors, callback, interval=1, periods=None, max_backoff=60
+    ):
+        super(InterleavedScheduler, self).__init__()
+        periods = periods if periods is not None else {}
+        self.__scheduled = tuple(
+            ScheduledSensor(s, periods.get(s) or interval, max_backoff)
+            for s in sensors
+        )
+        self.__callback = callback
+        self.__stopped = Event()
+        self.__queue = []
+        for (i, s) in enumerate(self.__scheduled):
+            heappush(self.__queue, (s.deadline, i))
+
+    def stop(self):
+        self.__stopped.set()
+
+    def step(self):
+        """resume the sensor which is due next. returns ``False`` once the\
+        scheduler has been stopped
+        """
+        (due, i) = heappop(self.__queue)
+        wait = due - monotonic()
+        if wait > 0 and self.__stopped.wait(wait):
+            return False
+        scheduled = self.__scheduled[i]
+        try:
+            if scheduled.generator is None:
+                scheduled.start(monotonic())
+            delay = next(scheduled.generator)
+        except StopIteration as e:
+            scheduled.complete(monotonic())
+            heappush(self.__queue, (scheduled.deadline, i))
+            values = e.value
+        except Exception as e:
+            scheduled.fail(monotonic(), e)
+            heappush(self.__queue, (scheduled.deadline, i))
+            return not self.__stopped.is_set()
+        else:
+            heappush(self.__queue, (monotonic() + delay, i))
+            return not self.__stopped.is_set()
+        try:
+            self.__callback(scheduled.sensor, values)
+        except Exception as e:
+            # e.g. a full disk under the sample log must not stop sampling
+            scheduled.callback_failed(e)
+        return not self.__stopped.is_set()
+
+    def run(self):
+        while self.step():
+            pass
+
+    def periods(self):
+        """returns ``{sensor: period}``
+        """
+        return dict((s.sensor, s.period) for s in self.__scheduled)
+
+    def overdue(self, tolerance_):
+        """returns the sensors which have not completed a sample for more\
+        than ``tolerance_`` periods
+        """
+        now = monotonic()
+        return tuple(
+            s.sensor for s in self.__scheduled if s.overdue(tolerance_, now)
+        )
+
+    def statistics(self):
+        return [s.statistics() for s in self.__scheduled]
@@ -3,12 +3,16 @@
 import os
 import time
 import json
+import math
+import atexit
 from logging.config import dictConfig
 
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, abort
 
 from . i2c import ThreadedCompositeSensor, BME280, TSL2561, TSL2572
+from . bus import shared_bus_statistics
+from . storage import SampleLog, GroupCommitWriter
 
 
 def gen_app(config_object=None, logsetting_file=None):
@@ -25,15 +29,22 @@ def gen_app(config_object=None, logsetting_file=None):
     if config_object is not None:
         app.config.update(**config_object)
 
-    bme = BME280(app.config['BME280_ADDRESS'])
-    bme.set_mode(app.config['BME280_MODE'])
-    bme.set_filter(app.config['BME280_FILTER'])
-    bme.set_humidity_oversampling(app.config['BME280_HUMIDITY_OVERSAMPLING'])
-    bme.set_pressure_oversampling(app.config['BME280_PRESSURE_OVERSAMPLING'])
-    bme.set_temperature_oversampling(
-        app.config['BME280_TEMPERATURE_OVERSAMPLING']
+    bme = BME280(
+        app.config['BME280_ADDRESS'],
+        bus_=app.config['I2C_BUS'],
+        calibration_cache_=app.config['BME280_CALIBRATION_CACHE'],
+        register_shadow_=app.config['I2C_REGISTER_SHADOW']
+    )
+    bme.configure(
+        mode_=app.config['BME280_MODE'],
+        filter_=app.config['BME280_FILTER'],
+        humidity_oversampling_=app.config['BME280_HUMIDITY_OVERSAMPLING'],
+        pressure_oversampling_=app.config['BME280_PRESSURE_OVERSAMPLING'],
+        temperature_oversampling_=app.config[
+            'BME280_TEMPERATURE_OVERSAMPLING'
+        ],
+        inactive_duration_=app.config['BME280_INACTIVE_DURATION']
     )
-    bme.set_inactive_duration(app.config['BME280_INACTIVE_DURATION'])
 
     if app.config['ILLUMINANCE_SENSOR'] == 'TSL2572':
         illuminance_sensor_class = TSL2572
@@ -44,44 +55,248 @@ def gen_app(config_object=None, logsetting_file=None):
             'Unknown illuminance sensor: ', app.config['ILLUMINANCE_SENSOR']
         )
 
-    sensor = ThreadedCompositeSensor((
-        bme,
-        illuminance_sensor_class(app.config['ILLUMINANCE_SENSOR_ADDRESS'])
-    ), lambda v: app.logger.info('sensor value.', extra=v))
+    illuminance_sensor = illuminance_sensor_class(
+        app.config['ILLUMINANCE_SENSOR_ADDRESS'], app.config['I2C_BUS'],
+        app.config['I2C_REGISTER_SHADOW']
+    )
+    if app.config['ILLUMINANCE_SENSOR_CONTINUOUS']:
+        if not isinstance(illuminance_sensor, TSL2572):
+            raise Exception(
+                'Continuous sampling is not supported by: ',
+                app.config['ILLUMINANCE_SENSOR']
+            )
+        illuminance_sensor.start_continuous(
+            app.config['ILLUMINANCE_SENSOR_THRESHOLD'],
+            app.config['ILLUMINANCE_SENSOR_PERSISTENCE'],
+            app.config['ILLUMINANCE_SENSOR_MAX_AGE']
+        )
+
+    sample_log = None
+    if app.config['STORAGE_DIRECTORY'] is not None:
+        sample_log = GroupCommitWriter(
+            SampleLog(
+                app.config['STORAGE_DIRECTORY'],
+                bme.attributes() + illuminance_sensor.attributes(),
+                app.config['STORAGE_SEGMENT_RECORDS']
+            ),
+            app.config['STORAGE_COMMIT_RECORDS'],
+            app.config['STORAGE_COMMIT_INTERVAL'],
+            app.config['STORAGE_QUEUE_SIZE'],
+            app.config['STORAGE_DURABILITY']
+        )
+
+    sensor = ThreadedCompositeSensor(
+        (bme, illuminance_sensor),
+        lambda v: app.logger.info('sensor value.', extra=v),
+        app.config['SAMPLING_INTERVAL'],
+        {
+            bme: app.config['BME280_SAMPLING_PERIOD'],
+            illuminance_sensor: app.config[
+                'ILLUMINANCE_SENSOR_SAMPLING_PERIOD'
+            ]
+        },
+        app.config['HISTORY_CAPACITY'],
+        app.config['HISTORY_AGGREGATE_WINDOWS'],
+        app.config['HISTORY_TIERS'],
+        sample_log,
+        app.config['STORAGE_RESTORE_SECONDS'],
+        app.config['HOOK_QUEUE_SIZE'],
+        app.config['HOOK_POLICY'],
+        app.config['SENSOR_MAX_BACKOFF'],
+        daemon=True
+    )
+
+    def shutdown():
+        # stop the sampling first so that every sample reaches the writer
+        sensor.stop()
+        sensor.join()
+        if sample_log is not None:
+            sample_log.stop()
+
+    atexit.register(shutdown)
+
+    def requested_attributes(available_):
+        if 'attributes' not in request.args:
+            return available_
+        attributes = request.args['attributes'].split(',')
+        for attr in attributes:
+            if attr not in available_:
+                abort(400)
+        return attributes
+
+    def finite_arg(name_, default_=None):
+        """returns query parameter ``name_`` as float. non-finite values\
+        are rejected with 400
+        """
+        value = request.args.get(name_, default_, type=float)
+        if value is not None and not math.isfinite(value):
+            abort(400)
+        return value
+
+    epoch = '{:x}'.format(int(time.time()))
+
+    def conditional(sequence_, expires_, build_):
+        """returns 304 if the client already has the sample of\
+        ``sequence_``, otherwise the response made by ``build_``
+
+        :param sequence_: sequence number of the sample
+        :param expires_: time at which the next sample is due
+        :param build_: function which returns the full response
+        """
+        etag = '{}-{}'.format(epoch, sequence_)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = build_()
+        response.set_etag(etag)
+        response.cache_control.max_age = max(
+            0, int(expires_ - time.time())
+        )
+        return response
+
+    def attribute_response(attr_, key_=None):
+        key = key_ if key_ is not None else attr_
+        snapshot = sensor.snapshot()
+        i = snapshot.index(attr_)
+        return conditional(
+            snapshot.sequences[i],
+            snapshot.timestamps[i] + snapshot.periods[i],
+            lambda: jsonify({
+                key: snapshot.values[i],
+                'timestamp': snapshot.timestamps[i],
+                'sequence': snapshot.sequences[i]
+            })
+        )
 
     @app.route('/api/temperature')
     def api_temperature():
-        return jsonify({
-            'temperature': sensor['temperature'],
-            'timestamp': time.time()
-        })
+        return attribute_response('temperature')
 
     @app.route('/api/pressure')
     def api_pressure():
-        return jsonify({
-            'pressure': sensor['pressure'],
-            'timestamp': time.time()
-        })
+        return attribute_response('pressure')
 
     @app.route('/api/humidity')
     def api_humidity():
-        return jsonify({
-            'humidiry': sensor['humidity'],
-            'timestamp': time.time()
-        })
+        return attribute_response('humidity', 'humidiry')
 
     @app.route('/api/illuminance')
     def api_illuminance():
-        return jsonify({
-            'illuminance': sensor['illuminance'],
-            'timestamp': time.time()
-        })
+        return attribute_response('illuminance')
 
     @app.route('/api/sensor')
     def api_sensor():
+        snapshot = sensor.snapshot()
+        return conditional(
+            snapshot.sequence, snapshot.expires,
+            lambda: Response(snapshot.body, mimetype='application/json')
+        )
+
+    @app.route('/api/sensor/stream')
+    def api_sensor_stream():
+        attributes = requested_attributes(tuple(sensor.attributes()))
+        deadband = finite_arg('deadband', 0.0)
+        if deadband < 0:
+            abort(400)
+        subscription = sensor.subscribe(
+            app.config['STREAM_QUEUE_SIZE'], 'coalesce'
+        )
+
+        def events():
+            keepalive = app.config['STREAM_KEEPALIVE']
+            sent = {}
+            try:
+                yield 'retry: 1000\n\n'
+                last = time.monotonic()
+                while not subscription.closed:
+                    sample = subscription.get(
+                        max(0.0, last + keepalive - time.monotonic())
+                    )
+                    if sample is None:
+                        yield ': keepalive\n\n'
+                        last = time.monotonic()
+                        continue
+                    (timestamp, values) = sample
+                    changed = dict(
+                        (a, values[a]) for a in attributes
+                        if a in values and (
+                            a not in sent or
+                            abs(values[a] - sent[a]) >= deadband
+                        )
+                    )
+                    if len(changed) == 0:
+                        continue
+                    sent.update(changed)
+                    changed['timestamp'] = timestamp
+                    yield 'data: {}\n\n'.format(json.dumps(changed))
+                    last = time.monotonic()
+            finally:
+                sensor.dispatcher().unsubscribe(subscription)
+
+        return Response(
+            events(), mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route('/api/sensor/history')
+    def api_sensor_history():
+        history = sensor.history()
+        if history is None:
+            abort(404)
+        attributes = requested_attributes(history.attributes())
+        since = time.time() - finite_arg('seconds', 600)
+        resolution = finite_arg('resolution')
+        result = {}
+        for attr in attributes:
+            result[attr] = dict(
+                (k, v if k == 'resolution' else v.tolist())
+                for (k, v) in history.query(
+                    attr, since, None, resolution
+                ).items()
+            )
+        return jsonify(result)
+
+    @app.route('/api/sensor/aggregate')
+    def api_sensor_aggregate():
+        history = sensor.history()
+        if history is None:
+            abort(404)
+        attributes = requested_attributes(history.attributes())
+        window = finite_arg('window', 600)
+        step = finite_arg('step')
+        try:
+            percentiles = tuple(
+                float(p)
+                for p in request.args.get('percentiles', '').split(',')
+                if p != ''
+            )
+        except ValueError:
+            abort(400)
+        if window <= 0 or (step is not None and (
+            step <= 0 or window / step > app.config['HISTORY_MAX_STEPS']
+        )) or any(not 0 <= p <= 100 for p in percentiles):
+            abort(400)
+        now = time.time()
         return jsonify(dict(
-            zip(sensor.attributes(), sensor.values()),
-            timestamp=time.time()
+            ((
+                attr,
+                history.aggregate(attr, window, now, step, percentiles)
+            ) for attr in attributes),
+            timestamp=now
         ))
 
+    @app.route('/api/status')
+    def api_status():
+        health = sensor.health(app.config['STALE_TOLERANCE'])
+        return jsonify({
+            'sensors': sensor.statistics(),
+            'health': health,
+            'stale': [a for (a, h) in health.items() if h['stale']],
+            'buses': shared_bus_statistics(),
+            'storage': None if sample_log is None else
+            sample_log.statistics(),
+            'dispatch': sensor.dispatcher().statistics(),
+            'timestamp': time.time()
+        })
+
     return app
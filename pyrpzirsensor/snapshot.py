@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+from collections import namedtuple, OrderedDict
+
+
+class Snapshot(namedtuple('Snapshot', (
+    'sequence', 'timestamp', 'expires', 'attributes', 'values',
+    'timestamps', 'sequences', 'periods', 'body'
+))):
+    """Immutable result of a sampling cycle.
+
+    The sampling thread builds a new snapshot for every sample and swaps it
+    in as one reference, so a reader which takes ``snapshot()`` once sees
+    values, timestamps and sequence numbers of the same cycle without
+    locking. ``body`` is the JSON document of ``/api/sensor`` encoded once
+    by the sampling thread, so requests do not encode it again.
+
+    :param sequence: sequence number of the latest sample
+    :param timestamp: acquisition time of the latest sample
+    :param expires: time at which the next sample is due
+    :param attributes: attribute names
+    :param values: latest value of each attribute
+    :param timestamps: acquisition time of each attribute
+    :param sequences: sequence number of the sample of each attribute
+    :param periods: sampling period of each attribute
+    :param body: UTF-8 encoded JSON of the values, ``timestamp`` and\
+    ``sequence``
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def encode(
+        cls, sequence_, attributes_, values_, timestamps_, sequences_,
+        periods_
+    ):
+        """returns ``Snapshot`` of a sampling cycle. the arguments after\
+        ``sequence_`` are sequences ordered by ``attributes_``
+        """
+        document = dict(zip(attributes_, values_))
+        document['timestamp'] = max(timestamps_)
+        document['sequence'] = sequence_
+        return cls(
+            sequence_, document['timestamp'],
+            min(t + p for (t, p) in zip(timestamps_, periods_)),
+            tuple(attributes_), tuple(values_), tuple(timestamps_),
+            tuple(sequences_), tuple(periods_),
+            json.dumps(document, sort_keys=True).encode('utf-8')
+        )
+
+    def index(self, attr_):
+        """returns the position of ``attr_``. raises ``KeyError`` if it is\
+        unknown
+        """
+        try:
+            return self.attributes.index(attr_)
+        except ValueError:
+            raise KeyError(attr_)
+
+    def get(self, attr_):
+        return self.values[self.index(attr_)]
+
+    def as_dict(self):
+        return OrderedDict(zip(self.attributes, self.values))
+
+    def ages(self, now_=None):
+        """returns seconds since each attribute has been sampled
+        """
+        now = now_ if now_ is not None else time.time()
+        return OrderedDict(
+            (a, now - t) for (a, t) in zip(self.attributes, self.timestamps)
+        )
+
+    def stale(self, tolerance_=2.0, now_=None):
+        """returns attributes which have not been sampled for more than\
+        ``tolerance_`` periods
+        """
+        now = now_ if now_ is not None else time.time()
+        return tuple(
+            a for (a, t, p) in zip(
+                self.attributes, self.timestamps, self.periods
+            ) if now - t > tolerance_ * p
+        )
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import mmap
+import struct
+from math import isnan
+from queue import Queue, Full, Empty
+from threading import Thread
+from time import monotonic
+
+
+class SampleSegment(object):
+    """Read access to a segment file of ``SampleLog``.
+
+    A segment starts with a header (``RPZS``, version, number of
+    attributes and their names as JSON, padded to 8 bytes) followed by
+    fixed-size records of little-endian float64: the timestamp and one value
+    per attribute. Records are read through ``mmap`` without copying the
+    file.
+
+    :param path_: path to the segment file
+    """
+
+    magic = b'RPZS'
+    version = 1
+    header_format = '<4sHHI'
+
+    def __init__(self, path_):
+        super(SampleSegment, self).__init__()
+        self.path = path_
+        with open(path_, 'rb') as fin:
+            (self.attributes, self.header_size) = self.read_header(fin)
+        self.record_size = 8 * (len(self.attributes) + 1)
+
+    @classmethod
+    def header(cls, attributes_):
+        names = json.dumps(list(attributes_)).encode('utf-8')
+        header = struct.pack(
+            cls.header_format, cls.magic, cls.version, len(attributes_),
+            len(names)
+        ) + names
+        return header + bytes(-len(header) % 8)
+
+    @classmethod
+    def read_header(cls, fin_):
+        size = struct.calcsize(cls.header_format)
+        (magic, version, n, length) = struct.unpack(
+            cls.header_format, fin_.read(size)
+        )
+        if magic != cls.magic or version != cls.version:
+            raise ValueError('not a sample segment')
+        attributes = tuple(json.loads(fin_.read(length).decode('utf-8')))
+        if len(attributes) != n:
+            raise ValueError('broken sample segment')
+        return (attributes, size + length + (-(size + length) % 8))
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - self.header_size) // \
+            self.record_size
+
+    def scan(self, since_=None, until_=None):
+        """yield ``(timestamp, values)`` of the records in
+        ``[since_, until_)``
+        """
+        n = len(self)
+        if n == 0:
+            return
+        width = len(self.attributes) + 1
+        with open(self.path, 'rb') as fin:
+            mm = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                records = memoryview(mm)[
+                    self.header_size:self.header_size + n * self.record_size
+                ].cast('d')
+                try:
+                    start = 0 if since_ is None else \
+                        self.__bisect(records, width, n, since_)
+                    stop = n if until_ is None else \
+                        self.__bisect(records, width, n, until_)
+                    for i in range(start, stop):
+                        base = i * width
+                        yield (
+                            records[base],
+                            tuple(records[base + 1:base + width])
+                        )
+                finally:
+                    records.release()
+            finally:
+                mm.close()
+
+    @staticmethod
+    def __bisect(records_, width_, n_, timestamp_):
+        (lo, hi) = (0, n_)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if records_[mid * width_] < timestamp_:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class SampleLog(object):
+    """Append-only binary log of samples split into segment files.
+
+    Each record is the timestamp and one float64 per attribute; attributes
+    which were not sampled are stored as NaN. A new segment is started
+    every ``segment_records_`` records.
+
+    :param directory_: directory for the segment files
+    :param attributes_: attribute names
+    :param segment_records_: number of records per segment
+    """
+
+    suffix = '.rpzs'
+
+    def __init__(self, directory_, attributes_, segment_records_=86400):
+        super(SampleLog, self).__init__()
+        self.directory = directory_
+        self.attributes = tuple(attributes_)
+        self.segment_records = segment_records_
+        self.__format = '<{}d'.format(len(self.attributes) + 1)
+        self.__file = None
+        self.__path = None
+        self.__records = 0
+        os.makedirs(directory_, exist_ok=True)
+        self.__open_last()
+
+    def segments(self):
+        return sorted(
+            os.path.join(self.directory, f)
+            for f in os.listdir(self.directory) if f.endswith(self.suffix)
+        )
+
+    def __open_last(self):
+        paths = self.segments()
+        if len(paths) == 0:
+            return
+        try:
+            segment = SampleSegment(paths[-1])
+        except (OSError, ValueError, struct.error):
+            return
+        if segment.attributes != self.attributes or \
+                len(segment) >= self.segment_records:
+            return
+        # drop a record which was partially written before a crash
+        records = len(segment)
+        self.__file = open(paths[-1], 'r+b')
+        self.__file.truncate(
+            segment.header_size + records * segment.record_size
+        )
+        self.__file.seek(0, os.SEEK_END)
+        self.__path = paths[-1]
+        self.__records = records
+
+    def __rotate(self):
+        self.close()
+        paths = self.segments()
+        number = 0
+        if len(paths) > 0:
+            number = int(os.path.basename(paths[-1])[:-len(self.suffix)]) + 1
+        path = os.path.join(
+            self.directory, '{:010d}{}'.format(number, self.suffix)
+        )
+        self.__file = open(path, 'wb')
+        self.__path = path
+        self.__records = 0
+        self.__file.write(SampleSegment.header(self.attributes))
+
+    def append(self, timestamp_, values_):
+        """append a record
+
+        :param timestamp_: acquisition time
+        :param values_: dict of ``{attribute: value}``
+        """
+        if self.__file is None or self.__records >= self.segment_records:
+            self.__rotate()
+        self.__file.write(struct.pack(self.__format, timestamp_, *(
+            values_.get(a, float('nan')) for a in self.attributes
+        )))
+        self.__records += 1
+
+    def flush(self):
+        if self.__file is not None:
+            self.__file.flush()
+
+    def sync(self):
+        if self.__file is not None:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def close(self):
+        if self.__file is not None:
+            try:
+                self.__file.close()
+            finally:
+                self.__file = None
+
+    def reopen(self):
+        """close the current segment and open it again after a failed write,
+        dropping a record which was partially written. returns the number of
+        records appended to the segment which did not reach the file
+        """
+        (path, records) = (self.__path, self.__records)
+        try:
+            self.close()
+        except OSError:
+            pass
+        (self.__path, self.__records) = (None, 0)
+        self.__open_last()
+        if path is None:
+            return 0
+        try:
+            stored = len(SampleSegment(path))
+        except (OSError, ValueError, struct.error):
+            stored = 0
+        return max(0, records - stored)
+
+    def scan(self, since_=None, until_=None):
+        """yield ``(timestamp, {attribute: value})`` of the records in
+        ``[since_, until_)``. NaN values are left out.
+        """
+        self.flush()
+        for path in self.segments():
+            try:
+                segment = SampleSegment(path)
+            except (OSError, ValueError, struct.error):
+                continue
+            for (timestamp, values) in segment.scan(since_, until_):
+                yield (timestamp, dict(
+                    (a, v) for (a, v) in zip(segment.attributes, values)
+                    if not isnan(v)
+                ))
+
+    def restore(self, history_, since_):
+        """load records since ``since_`` into a ``History``
+        """
+        for (timestamp, values) in self.scan(since_):
+            history_.record(timestamp, values)
+
+
+class GroupCommitWriter(Thread):
+    """Writes samples to a ``SampleLog`` in batches from a background
+    thread.
+
+    ``append`` only puts the sample on a bounded queue, so the caller never
+    waits for the disk. The writer commits once ``max_batch_`` samples are
+    queued or the oldest one has waited ``max_delay_`` seconds. Samples
+    which do not fit in the queue are dropped and counted, and so are the
+    samples of a batch which did not reach the file when its commit fails;
+    the log is then reopened so that the next batch starts at a whole
+    record. Samples still queued when the process ends without ``stop()``
+    are lost.
+
+    :param sample_log_: ``SampleLog`` to write to
+    :param max_batch_: maximum number of samples per commit
+    :param max_delay_: maximum seconds a sample waits for its commit
+    :param queue_size_: maximum number of samples waiting for commit
+    :param durability_: ``'flush'`` hands each batch to the OS, which\
+    survives a crash of the process. ``'fsync'`` also syncs it to the\
+    storage, which survives a power loss
+    """
+
+    durabilities = ('flush', 'fsync')
+
+    def __init__(
+        self, sample_log_, max_batch_=60, max_delay_=60.0, queue_size_=3600,
+        durability_='flush'
+    ):
+        super(GroupCommitWriter, self).__init__(daemon=True)
+        if durability_ not in self.durabilities:
+            raise ValueError(durability_)
+        self.__sample_log = sample_log_
+        self.__max_batch = max_batch_
+        self.__max_delay = max_delay_
+        self.__durability = durability_
+        self.__queue = Queue(queue_size_)
+        self.queue_size = queue_size_
+        self.appended = 0
+        self.dropped = 0
+        self.committed = 0
+        self.batches = 0
+        self.errors = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.max_commit_duration = 0.0
+        self.max_lag = 0.0
+        self.start()
+
+    @property
+    def attributes(self):
+        return self.__sample_log.attributes
+
+    def append(self, timestamp_, values_):
+        """queue a sample without blocking
+        """
+        try:
+            self.__queue.put_nowait((monotonic(), timestamp_, values_))
+        except Full:
+            self.dropped += 1
+            return
+        self.appended += 1
+        depth = self.__queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def scan(self, since_=None, until_=None):
+        return self.__sample_log.scan(since_, until_)
+
+    def restore(self, history_, since_):
+        self.__sample_log.restore(history_, since_)
+
+    def stop(self):
+        """commit the queued samples and close the log
+        """
+        if not self.is_alive():
+            return
+        self.__queue.put(None)
+        self.join()
+
+    def run(self):
+        stopped = False
+        while not stopped:
+            item = self.__queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = item[0] + self.__max_delay
+            while len(batch) < self.__max_batch:
+                try:
+                    item = self.__queue.get(
+                        timeout=max(0.0, deadline - monotonic())
+                    )
+                except Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            self.__commit(batch)
+        self.__sample_log.close()
+
+    def __commit(self, batch_):
+        start = monotonic()
+        written = 0
+        try:
+            for (_, timestamp, values) in batch_:
+                self.__sample_log.append(timestamp, values)
+                written += 1
+            if self.__durability == 'fsync':
+                self.__sample_log.sync()
+            else:
+                self.__sample_log.flush()
+        except OSError:
+            self.errors += 1
+            try:
+                written -= self.__sample_log.reopen()
+            except OSError:
+                written = 0
+            written = max(0, written)
+            self.committed += written
+            self.failed += len(batch_) - written
+            return
+        end = monotonic()
+        self.committed += len(batch_)
+        self.batches += 1
+        self.max_commit_duration = max(self.max_commit_duration, end - start)
+        self.max_lag = max(self.max_lag, end - batch_[0][0])
+
+    def statistics(self):
+        return {
+            'appended': self.appended,
+            'committed': self.committed,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'failed': self.failed,
+            'queue_depth': self.__queue.qsize(),
+            'queue_size': self.queue_size,
+            'max_queue_depth': self.max_queue_depth,
+            'max_commit_duration': self.max_commit_duration,
+            'max_lag': self.max_lag,
+            'durability': self.__durability
+        }
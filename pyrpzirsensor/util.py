@@ -1,6 +1,7 @@
 # -*- coding utf-8 -*-
 
 from collections import UserDict
+from time import sleep
 
 
 def uint16_to_signed16(uint_):
@@ -15,6 +16,22 @@ def uint8_to_signed8(uint_):
     return uint_
 
 
+def replace_bits(byte_, datum_, offset_, length_):
+    mask = ((1 << length_) - 1) << offset_
+    return ((datum_ << offset_) & mask) | (byte_ & (0xFF ^ mask))
+
+
+def drive(generator_):
+    """run a generator which yields seconds to wait, sleeping in between,
+    and return its return value
+    """
+    try:
+        while True:
+            sleep(next(generator_))
+    except StopIteration as e:
+        return e.value
+
+
 class MultiDict(UserDict):
     def __init__(self, *args, **kwargs):
         super(MultiDict, self).__init__(*args, **kwargs)
@@ -50,3 +67,105 @@ class BidirectionalMultiDict(MultiDict):
                 if len(self.inverse.data[d]) == 0:
                     del self.inverse.data[d]
         super(BidirectionalMultiDict, self).__delitem__(key)
+
+
+class AutoRange(object):
+    """Chooses gain and integration time of a light sensor from the previous
+    reading and its trend, so that most samples need one integration.
+
+    A range is predicted by extrapolating the last reading, normalized by
+    ``gain * time``, with the ratio to the reading before it. The least
+    sensitive range which is expected to give ``sufficient_`` counts is
+    chosen, but never one which is expected to exceed ``headroom_`` of its
+    saturation. A reading is retried at another range only when it is
+    saturated or below ``underflow_`` counts.
+
+    :param ranges_: ``(gain, time, saturation)`` of the usable ranges
+    :param default_: ``(gain, time)`` used until the first reading
+    :param sufficient_: counts which give enough resolution
+    :param underflow_: counts below which a more sensitive range is tried
+    :param headroom_: fraction of saturation a prediction may use
+    """
+
+    max_trend = 4.0
+
+    def __init__(
+        self, ranges_, default_, sufficient_=3000, underflow_=100,
+        headroom_=0.5
+    ):
+        super(AutoRange, self).__init__()
+        self.ranges = tuple(sorted(ranges_, key=lambda r: r[0] * r[1]))
+        self.default = [(g, t) for (g, t, _) in self.ranges].index(
+            tuple(default_)
+        )
+        self.sufficient = sufficient_
+        self.underflow = underflow_
+        self.headroom = headroom_
+        self.samples = 0
+        self.integrations = 0
+        self.__level = None
+        self.__trend = 1.0
+
+    def sensitivity(self, index_):
+        (gain, time, _) = self.ranges[index_]
+        return gain * time
+
+    def choose(self, level_):
+        """returns index of the range for counts per unit sensitivity
+        """
+        choice = 0
+        for (i, (gain, time, saturation)) in enumerate(self.ranges):
+            counts = level_ * gain * time
+            if i > 0 and counts > self.headroom * saturation:
+                break
+            choice = i
+            if counts >= self.sufficient:
+                break
+        return choice
+
+    def predict(self):
+        """returns index of the range for the next sample
+        """
+        if self.__level is None:
+            return self.default
+        return self.choose(self.__level * self.__trend)
+
+    def retry(self, index_, counts_):
+        """returns index of the range to integrate again at, or ``None``\
+        if ``counts_`` read at ``index_`` is usable
+        """
+        self.integrations += 1
+        saturation = self.ranges[index_][2]
+        if counts_ >= saturation:
+            if index_ == 0:
+                return None
+            return min(
+                index_ - 1, self.choose(counts_ / self.sensitivity(index_))
+            )
+        if counts_ < self.underflow and index_ < len(self.ranges) - 1:
+            if counts_ == 0:
+                return len(self.ranges) - 1
+            choice = self.choose(counts_ / self.sensitivity(index_))
+            return choice if choice > index_ else None
+        return None
+
+    def update(self, index_, counts_):
+        """record the reading a sample has been made of
+        """
+        self.samples += 1
+        level = counts_ / self.sensitivity(index_)
+        if self.__level and level > 0:
+            self.__trend = min(
+                max(level / self.__level, 1 / self.max_trend), self.max_trend
+            )
+        else:
+            self.__trend = 1.0
+        self.__level = level
+
+    def statistics(self):
+        return {
+            'samples': self.samples,
+            'integrations': self.integrations,
+            'integrations_per_sample': None if self.samples == 0 else
+            self.integrations / self.samples
+        }
@@ -17,5 +17,6 @@ setup(
     description=__description__,
     long_description=__long_description__,
     packages=[__package_name__],
-    install_requires=['flask']
+    install_requires=['flask'],
+    extras_require={'numpy': ['numpy']}
 )
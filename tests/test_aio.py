@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import unittest
+
+from pyrpzirsensor.aio import AsyncSensor, AsyncCompositeSensor
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280, TSL2572
+
+
+class CountingSensor(object):
+    """sensor whose samples record how many of them overlap
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.samples = 0
+
+    def attributes(self):
+        return ('count', )
+
+    def sample(self):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            yield 0.01
+            yield 0.01
+            self.samples += 1
+            return (self.samples, )
+        finally:
+            self.active -= 1
+
+
+class AsyncSensorTest(unittest.TestCase):
+    def test_samples_do_not_overlap(self):
+        sensor = CountingSensor()
+        async_sensor = AsyncSensor(sensor)
+
+        async def sample():
+            return await asyncio.gather(
+                *(async_sensor.values() for _ in range(4))
+            )
+
+        results = asyncio.run(sample())
+        self.assertEqual(sorted(results), [(1, ), (2, ), (3, ), (4, )])
+        self.assertEqual(sensor.max_active, 1)
+
+
+class AsyncCompositeSensorTest(unittest.TestCase):
+    def test_failure_stops_every_sensor(self):
+        bus = SimulatedSMBus({
+            0x77: SimulatedBME280(), 0x39: SimulatedTSL2572()
+        })
+        sensor = AsyncCompositeSensor((BME280(0x77, bus), TSL2572(0x39, bus)))
+        calls = []
+
+        async def sample():
+            task = asyncio.ensure_future(
+                sensor.run(lambda v: calls.append(dict(v)), 0.02)
+            )
+            while not any('illuminance' in c for c in calls):
+                await asyncio.sleep(0.01)
+            del bus.devices[0x77]
+            with self.assertRaises(OSError):
+                await task
+            count = len(calls)
+            transactions = bus.transactions
+            await asyncio.sleep(0.5)
+            self.assertEqual(len(calls), count)
+            self.assertEqual(bus.transactions, transactions)
+
+        asyncio.run(sample())
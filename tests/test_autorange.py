@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import struct
+import unittest
+
+from pyrpzirsensor.bus import SimulatedSMBus, SimulatedTSL2572
+from pyrpzirsensor.i2c import TSL2572
+from pyrpzirsensor.util import AutoRange
+
+
+def run(generator_):
+    """drive a sampling generator without waiting
+    """
+    try:
+        while True:
+            next(generator_)
+    except StopIteration as e:
+        return e.value
+
+
+class AutoRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.auto_range = AutoRange(
+            ((10, 100, 10000), (1, 10, 1000), (10, 10, 1000)), (10, 10),
+            sufficient_=300, underflow_=10
+        )
+
+    def test_ranges_are_sorted_by_sensitivity(self):
+        self.assertEqual(
+            [self.auto_range.sensitivity(i) for i in range(3)],
+            [10, 100, 1000]
+        )
+        self.assertEqual(self.auto_range.predict(), 1)
+
+    def test_choose(self):
+        self.assertEqual(self.auto_range.choose(50), 0)
+        self.assertEqual(self.auto_range.choose(5), 1)
+        self.assertEqual(self.auto_range.choose(0.1), 2)
+        # 600 counts at range 1 would exceed half of its saturation
+        self.assertEqual(self.auto_range.choose(6), 0)
+
+    def test_retry(self):
+        self.assertEqual(self.auto_range.retry(1, 1000), 0)
+        self.assertIsNone(self.auto_range.retry(0, 1000))
+        self.assertEqual(self.auto_range.retry(0, 0), 2)
+        self.assertEqual(self.auto_range.retry(0, 5), 2)
+        self.assertIsNone(self.auto_range.retry(2, 5))
+        self.assertIsNone(self.auto_range.retry(1, 500))
+        self.assertEqual(self.auto_range.integrations, 6)
+
+    def test_trend(self):
+        self.auto_range.update(1, 100)
+        self.assertEqual(self.auto_range.predict(), 2)
+        # the level has doubled, so the next one is expected at 4
+        self.auto_range.update(2, 2000)
+        self.assertEqual(self.auto_range.predict(), 1)
+        self.assertEqual(self.auto_range.statistics()['samples'], 2)
+
+
+class RestlessAutoRange(AutoRange):
+    """asks for another range after every integration
+    """
+
+    def __init__(self, *args):
+        super(RestlessAutoRange, self).__init__(*args)
+        self.integrated = []
+        self.updated = []
+
+    def retry(self, index_, counts_):
+        super(RestlessAutoRange, self).retry(index_, counts_)
+        self.integrated.append((index_, counts_))
+        return (index_ + 1) % len(self.ranges)
+
+    def update(self, index_, counts_):
+        self.updated.append((index_, counts_))
+        super(RestlessAutoRange, self).update(index_, counts_)
+
+
+class TSL2572AutoRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedTSL2572()
+        self.device.set_light(2.0, 0.5)
+        self.sensor = TSL2572(0x39, SimulatedSMBus({0x39: self.device}))
+        self.lux = run(self.sensor.sample())[0]
+
+    def restless(self):
+        self.sensor.auto_range = RestlessAutoRange(
+            self.sensor.auto_range.ranges,
+            self.sensor.auto_range.ranges[0][:2]
+        )
+        return self.sensor.auto_range
+
+    def test_update_gets_the_range_read_last(self):
+        auto_range = self.restless()
+        run(self.sensor.sample())
+        self.assertEqual(len(auto_range.integrated), len(auto_range.ranges))
+        self.assertEqual(auto_range.updated, auto_range.integrated[-1:])
+
+    def test_continuous_update_gets_the_range_read_last(self):
+        self.sensor.start_continuous()
+        auto_range = self.restless()
+        run(self.sensor.sample())
+        self.assertEqual(auto_range.updated, auto_range.integrated[-1:])
+        (index, counts) = auto_range.updated[0]
+        (gain, time, _) = auto_range.ranges[index]
+        self.assertEqual(self.sensor.get_time(), time)
+        self.assertEqual(self.sensor.get_gain(), gain)
+        width = max(int(counts * 0.1), 1)
+        self.assertEqual(
+            struct.unpack('<HH', self.device.registers[0x04:0x08]),
+            (max(0, counts - width), min(0xFFFF, counts + width))
+        )
+
+    def test_sweep(self):
+        light = 0.01
+        while light < 2000:
+            self.device.set_light(light, light / 4)
+            lux = run(self.sensor.sample())[0]
+            self.assertAlmostEqual(
+                lux / light, self.lux / 2.0, delta=0.05 * self.lux / 2.0
+            )
+            light *= 1.25
+        statistics = self.sensor.auto_range.statistics()
+        self.assertLess(statistics['integrations_per_sample'], 1.1)
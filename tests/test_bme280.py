@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pyrpzirsensor.bus import SimulatedSMBus, SimulatedBME280
+from pyrpzirsensor.i2c import BME280, CalibrationCache
+
+
+class CalibrationTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = SimulatedSMBus({0x77: SimulatedBME280()})
+
+    def test_two_block_reads(self):
+        BME280(0x77, self.bus)
+        self.assertEqual(self.bus.transactions, 2)
+
+    def test_decode(self):
+        cal = BME280(0x77, self.bus).get_calibration()
+        self.assertEqual(
+            tuple(cal['dig_T{}'.format(i)] for i in range(1, 4)) +
+            tuple(cal['dig_P{}'.format(i)] for i in range(1, 10)),
+            SimulatedBME280.calibration
+        )
+        self.assertEqual(
+            tuple(cal['dig_H{}'.format(i)] for i in range(1, 7)),
+            SimulatedBME280.humidity_calibration
+        )
+
+    def test_decode_signed_humidity(self):
+        # dig_H4 and dig_H5 are 12-bit signed values sharing 0xE5
+        device = SimulatedBME280()
+        device.registers[0xE4:0xE7] = bytes((0xF0, 0x3E, 0xFC))
+        cal = BME280(0x77, SimulatedSMBus({0x77: device})).get_calibration()
+        self.assertEqual(cal['dig_H4'], -256 + 0xE)
+        self.assertEqual(cal['dig_H5'], -64 + 0x3)
+
+
+class ConfigureTest(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedBME280()
+        self.bus = SimulatedSMBus({0x77: self.device})
+        self.sensor = BME280(0x77, self.bus)
+        self.bus.reset_counter()
+
+    def test_one_read_and_one_burst(self):
+        self.sensor.configure(
+            filter_=4, humidity_oversampling_=2, pressure_oversampling_=4,
+            temperature_oversampling_=2, inactive_duration_=1000
+        )
+        self.assertEqual(self.bus.transactions, 2)
+        self.assertEqual(self.sensor.get_filter(), 4)
+        self.assertEqual(self.sensor.get_humidity_oversampling(), 2)
+        self.assertEqual(self.sensor.get_pressure_oversampling(), 4)
+        self.assertEqual(self.sensor.get_temperature_oversampling(), 2)
+        self.assertEqual(self.sensor.get_inactive_duration(), 1000)
+
+    def test_unchanged_registers_are_not_written(self):
+        self.sensor.configure(filter_=4, humidity_oversampling_=2)
+        self.bus.reset_counter()
+        self.sensor.configure(filter_=4, humidity_oversampling_=2)
+        self.assertEqual(self.bus.transactions, 1)
+
+    def test_config_is_written_while_sleeping(self):
+        self.sensor.configure(mode_='normal', temperature_oversampling_=1)
+        writes = []
+        write = self.device.write
+        self.device.write = lambda cmd_, data_: (
+            writes.append([cmd_] + list(data_)), write(cmd_, data_)
+        )
+        self.sensor.configure(filter_=16)
+        # ctrl_meas to sleep, config, then ctrl_meas back to normal
+        self.assertEqual(writes, [[0xF4, 0x20, 0xF5, 0x10, 0xF4, 0x23]])
+        self.assertEqual(self.sensor.get_mode(), 'normal')
+        self.assertEqual(self.sensor.get_filter(), 16)
+
+    def test_invalid_value_writes_nothing(self):
+        with self.assertRaises(ValueError):
+            self.sensor.configure(filter_=4, humidity_oversampling_=3)
+        self.assertEqual(self.bus.transactions, 0)
+        self.assertEqual(self.sensor.get_filter(), 0)
+
+
+class StuckBME280(SimulatedBME280):
+    """BME280 whose forced measurements never complete
+    """
+
+    def write(self, cmd_, data_):
+        super(StuckBME280, self).write(cmd_, data_)
+        if self.registers[0xF4] & 0x03 == 0:
+            self.registers[0xF3] |= 0x08
+
+
+class MeasurementTest(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedBME280()
+        self.bus = SimulatedSMBus({0x77: self.device})
+        self.sensor = BME280(0x77, self.bus)
+        self.sensor.configure(
+            mode_='forced', humidity_oversampling_=1,
+            pressure_oversampling_=1, temperature_oversampling_=1
+        )
+
+    def test_measurement_time(self):
+        # datasheet appendix B with all oversampling at 1
+        self.assertAlmostEqual(
+            self.sensor.get_measurement_time(typical_=True), 8.0
+        )
+        self.assertAlmostEqual(self.sensor.get_measurement_time(), 9.3)
+        self.sensor.configure(humidity_oversampling_=0)
+        self.assertAlmostEqual(
+            self.sensor.get_measurement_time(typical_=True), 5.5
+        )
+
+    def test_forced_measurement(self):
+        generator = self.sensor.measurement()
+        self.assertAlmostEqual(next(generator), 0.008)
+        self.assertEqual(self.device.registers[0xF4] & 0x03, 0)
+        with self.assertRaises(StopIteration):
+            next(generator)
+        self.assertEqual(self.sensor.get_mode(), 'sleep')
+
+    def test_measurement_timeout(self):
+        sensor = BME280(0x77, SimulatedSMBus({0x77: StuckBME280()}))
+        sensor.configure(mode_='forced', temperature_oversampling_=1)
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            sensor.measure(timeout_=0.05)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+
+class CalibrationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'calibration.json')
+        self.bus = SimulatedSMBus({0x77: SimulatedBME280()})
+        self.expected = BME280(0x77, self.bus).get_calibration()
+        self.bus.reset_counter()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        sensor = BME280(0x77, self.bus, calibration_cache_=self.path)
+        self.assertEqual(sensor.get_calibration(), self.expected)
+        transactions = self.bus.transactions
+        self.bus.reset_counter()
+        return transactions
+
+    def test_hit_reads_the_chip_id_only(self):
+        self.assertEqual(self.load(), 3)
+        self.assertEqual(self.load(), 1)
+
+    def test_key(self):
+        self.assertEqual(CalibrationCache.key(1, 0x77, 0x60), '1:0x77:0x60')
+
+    def test_entries_of_other_sensors_are_kept(self):
+        self.load()
+        other = CalibrationCache.key(1, 0x76, 0x60)
+        CalibrationCache(self.path).put(other, (b'\x01' * 26, b'\x02' * 7))
+        self.assertEqual(self.load(), 1)
+        self.assertEqual(
+            CalibrationCache(self.path).get(other),
+            (b'\x01' * 26, b'\x02' * 7)
+        )
+
+    def test_unwritable_cache(self):
+        path = os.path.join(self.directory, 'missing', 'calibration.json')
+        sensor = BME280(0x77, self.bus, calibration_cache_=path)
+        self.assertEqual(sensor.get_calibration(), self.expected)
+        self.assertFalse(os.path.exists(path))
+
+    def test_broken_entries_are_read_again(self):
+        key = CalibrationCache.key(None, 0x77, 0x60)
+        for entries in (
+            [], {key: ['00' * 26]}, {key: ['00' * 26, '00' * 6]},
+            {key: ['zz', '00']}, {key: 'ff'}
+        ):
+            with open(self.path, 'w') as fout:
+                json.dump(entries, fout)
+            self.assertEqual(self.load(), 3)
+            self.assertEqual(self.load(), 1)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import unittest
+
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280, TSL2572
+
+
+class SimulatedSMBusTest(unittest.TestCase):
+    def setUp(self):
+        self.bme280 = SimulatedBME280()
+        self.tsl2572 = SimulatedTSL2572()
+        self.bus = SimulatedSMBus({0x77: self.bme280, 0x39: self.tsl2572})
+
+    def test_unknown_address(self):
+        with self.assertRaises(OSError) as cm:
+            self.bus.read_i2c_block_data(0x40, 0x00, 1)
+        self.assertEqual(cm.exception.errno, errno.EREMOTEIO)
+        self.assertEqual(self.bus.transactions, 1)
+
+    def test_transactions_are_counted(self):
+        self.bus.read_i2c_block_data(0x77, 0xD0, 1)
+        self.bus.write_i2c_block_data(0x77, 0xF5, [0x10])
+        self.bus.write_byte(0x39, 0xE6)
+        self.assertEqual(self.bus.transactions, 3)
+        self.bus.reset_counter()
+        self.assertEqual(self.bus.transactions, 0)
+
+    def test_bme280_register_map(self):
+        self.assertEqual(self.bus.read_i2c_block_data(0x77, 0xD0, 1), [0x60])
+        # burst write of (address, value) pairs after the first value
+        self.bus.write_i2c_block_data(0x77, 0xF2, [0x02, 0xF5, 0x10])
+        self.assertEqual(self.bme280.registers[0xF2], 0x02)
+        self.assertEqual(self.bme280.registers[0xF5], 0x10)
+        # a forced measurement completes and returns to sleep mode
+        self.bus.write_i2c_block_data(0x77, 0xF4, [0x25])
+        self.assertEqual(self.bme280.registers[0xF4], 0x24)
+
+    def test_bme280_driver(self):
+        sensor = BME280(0x77, self.bus)
+        self.bme280.set_adc(415148, 519888, 30000)
+        self.assertAlmostEqual(sensor.get_temperature(), 25.08, places=2)
+
+    def test_tsl2572_integration(self):
+        sensor = TSL2572(0x39, self.bus)
+        self.bus.reset_counter()
+        self.assertEqual(sensor.integrate(1, 200), (1000, 200))
+        # power off, time, two gain registers, power on, status, power
+        # off and the ADC block
+        self.assertEqual(self.bus.transactions, 8)
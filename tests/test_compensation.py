@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+from unittest import mock
+
+from pyrpzirsensor.bus import SimulatedSMBus, SimulatedBME280
+from pyrpzirsensor.i2c import BME280
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class CompensateBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.sensor = BME280(0x77, SimulatedSMBus({0x77: SimulatedBME280()}))
+        rng = random.Random(1)
+        self.adc = (
+            [rng.randrange(1 << 20) for _ in range(2000)] + [0, 0xFFFFF],
+            [rng.randrange(1 << 20) for _ in range(2000)] + [0, 0xFFFFF],
+            [rng.randrange(1 << 16) for _ in range(2000)] + [0, 0xFFFF]
+        )
+
+    def assertBitExact(self, sensor_):
+        (pressure, temperature, humidity) = sensor_.compensate_batch(
+            *self.adc
+        )
+        for (i, (adc_p, adc_t, adc_h)) in enumerate(zip(*self.adc)):
+            t_fine = sensor_.get_t_fine(adc_t)
+            self.assertEqual(
+                temperature[i], sensor_.get_temperature(t_fine)
+            )
+            self.assertEqual(
+                pressure[i], sensor_.get_pressure(t_fine, adc_p)
+            )
+            self.assertEqual(
+                humidity[i], sensor_.get_humidity(t_fine, adc_h)
+            )
+
+    def test_bit_exact(self):
+        with mock.patch.object(
+            self.sensor, 'get_pressure', wraps=self.sensor.get_pressure
+        ) as get_pressure:
+            self.sensor.compensate_batch(*self.adc)
+            self.assertEqual(get_pressure.call_count, 0)
+        self.assertBitExact(self.sensor)
+
+    def test_bit_exact_with_fallback(self):
+        # a small dig_P1 makes pressures which overflow int64, so some of
+        # the samples are compensated by get_pressure
+        cal = self.sensor.get_calibration()
+        cal['dig_P1'] = 1000
+        sensor = BME280(0x77, SimulatedSMBus(), calibration_=cal)
+        with mock.patch.object(
+            sensor, 'get_pressure', wraps=sensor.get_pressure
+        ) as get_pressure:
+            sensor.compensate_batch(*self.adc)
+            fallbacks = get_pressure.call_count
+        self.assertGreater(fallbacks, 0)
+        self.assertLess(fallbacks, len(self.adc[0]))
+        self.assertBitExact(sensor)
+
+    def test_invalid_calibration(self):
+        cal = self.sensor.get_calibration()
+        cal['dig_P1'] = 0
+        sensor = BME280(0x77, SimulatedSMBus(), calibration_=cal)
+        (pressure, _, _) = sensor.compensate_batch(*self.adc)
+        self.assertFalse(pressure.any())
+        self.assertBitExact(sensor)
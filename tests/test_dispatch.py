@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from pyrpzirsensor.dispatch import Dispatcher, Subscription
+
+
+class SubscriptionTest(unittest.TestCase):
+    def fill(self, subscription_):
+        for i in range(4):
+            subscription_.put(float(i), {'a': i, 'b': -i} if i < 2 else {
+                'a': i
+            })
+
+    def drain(self, subscription_):
+        samples = []
+        while len(subscription_) > 0:
+            samples.append(subscription_.get(0))
+        return samples
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Subscription(4, 'drop_all')
+        with self.assertRaises(ValueError):
+            Subscription(0)
+
+    def test_drop_oldest(self):
+        subscription = Subscription(2, 'drop_oldest')
+        self.fill(subscription)
+        self.assertEqual(
+            self.drain(subscription), [(2.0, {'a': 2}), (3.0, {'a': 3})]
+        )
+        statistics = subscription.statistics()
+        self.assertEqual(statistics['published'], 4)
+        self.assertEqual(statistics['delivered'], 2)
+        self.assertEqual(statistics['dropped'], 2)
+        self.assertEqual(statistics['coalesced'], 0)
+
+    def test_drop_newest(self):
+        subscription = Subscription(2, 'drop_newest')
+        self.fill(subscription)
+        self.assertEqual(self.drain(subscription), [
+            (0.0, {'a': 0, 'b': 0}), (1.0, {'a': 1, 'b': -1})
+        ])
+        self.assertEqual(subscription.statistics()['dropped'], 2)
+
+    def test_coalesce(self):
+        subscription = Subscription(2, 'coalesce')
+        self.fill(subscription)
+        # the newest queued sample keeps the latest value of every
+        # attribute
+        self.assertEqual(self.drain(subscription), [
+            (0.0, {'a': 0, 'b': 0}), (3.0, {'a': 3, 'b': -1})
+        ])
+        statistics = subscription.statistics()
+        self.assertEqual(statistics['dropped'], 0)
+        self.assertEqual(statistics['coalesced'], 2)
+
+    def test_get_timeout_and_close(self):
+        subscription = Subscription()
+        self.assertIsNone(subscription.get(0.01))
+        subscription.put(1.0, {'a': 1})
+        subscription.close()
+        self.assertEqual(subscription.get(0), (1.0, {'a': 1}))
+        self.assertIsNone(subscription.get())
+        subscription.put(2.0, {'a': 2})
+        self.assertEqual(subscription.statistics()['published'], 1)
+
+
+class DispatcherTest(unittest.TestCase):
+    def test_fan_out(self):
+        dispatcher = Dispatcher()
+        first = dispatcher.subscribe()
+        second = dispatcher.subscribe(1, 'drop_newest')
+        dispatcher.publish(1.0, {'a': 1})
+        dispatcher.publish(2.0, {'a': 2})
+        self.assertEqual(first.get(0), (1.0, {'a': 1}))
+        self.assertEqual(first.get(0), (2.0, {'a': 2}))
+        self.assertEqual(second.get(0), (1.0, {'a': 1}))
+        dispatcher.unsubscribe(first)
+        self.assertTrue(first.closed)
+        dispatcher.publish(3.0, {'a': 3})
+        self.assertIsNone(first.get(0))
+        self.assertEqual(
+            [s['published'] for s in
+             dispatcher.statistics()['subscriptions']], [3]
+        )
+
+    def test_hook(self):
+        dispatcher = Dispatcher()
+        called = threading.Event()
+        values = []
+
+        def hook(values_):
+            if values_['a'] == 2:
+                raise RuntimeError('broken hook')
+            values.append(values_['a'])
+            if values_['a'] == 3:
+                called.set()
+
+        worker = dispatcher.add_hook(hook)
+        for i in range(1, 4):
+            dispatcher.publish(float(i), {'a': i})
+        self.assertTrue(called.wait(5))
+        self.assertEqual(values, [1, 3])
+        statistics = dispatcher.statistics()
+        self.assertEqual(statistics['subscriptions'], [])
+        self.assertEqual(statistics['hooks'][0]['errors'], 1)
+        self.assertEqual(statistics['hooks'][0]['delivered'], 3)
+        dispatcher.close()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+
+    def test_slow_hook_does_not_block_publish(self):
+        dispatcher = Dispatcher()
+        release = threading.Event()
+        worker = dispatcher.add_hook(lambda v: release.wait(5), 2)
+        for i in range(10):
+            dispatcher.publish(float(i), {'a': i})
+        self.assertGreater(worker.statistics()['dropped'], 0)
+        release.set()
+        dispatcher.close()
+        worker.join(5)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from pyrpzirsensor import history as history_module
+from pyrpzirsensor.history import aggregate, RingBuffer, History
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RollingWindowTest(unittest.TestCase):
+    def assertAggregateEqual(self, rolling_, expected_):
+        self.assertEqual(rolling_['count'], expected_['count'])
+        for k in ('min', 'max'):
+            self.assertEqual(rolling_[k], expected_[k])
+        for k in ('mean', 'stddev'):
+            self.assertAlmostEqual(rolling_[k], expected_[k], places=6)
+
+    def test_matches_aggregate(self):
+        rng = random.Random(1)
+        buf = RingBuffer(20, windows_=(5.0, 30.0))
+        timestamp = 1000000.0
+        for _ in range(500):
+            timestamp += rng.uniform(0.1, 2.0)
+            buf.append(timestamp, 1013.25 + rng.gauss(0, 3))
+            for w in buf.windows():
+                (_, values) = buf.window(timestamp - w)
+                self.assertAggregateEqual(
+                    buf.rolling(w, timestamp), aggregate(values)
+                )
+
+    def test_empty_window(self):
+        buf = RingBuffer(10, windows_=(5.0, ))
+        buf.append(1.0, 10.0)
+        self.assertEqual(buf.rolling(5.0, 100.0), aggregate(()))
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_samples_older_than_the_latest_are_discarded(self):
+        buf = RingBuffer(100, windows_=(60.0, ))
+        for i in range(50):
+            self.assertTrue(buf.append(1000.0 + i, float(i)))
+        for i in range(10):
+            self.assertFalse(buf.append(100.0 + i, -1.0))
+        self.assertEqual(buf.discarded, 10)
+        self.assertEqual(len(buf), 50)
+        (timestamps, values) = buf.window(105.0, 1010.0)
+        self.assertEqual(list(timestamps), [1000.0 + i for i in range(10)])
+        self.assertEqual(len(buf.window(1045.0)[0]), 5)
+        self.assertEqual(buf.rolling(60.0, 1049.0)['count'], 50)
+        self.assertEqual(buf.rolling(60.0, 1049.0)['min'], 0.0)
+
+    def test_history_records_only_the_samples_in_order(self):
+        history = History(('temperature', ), 100, tiers_=((10, 10), ))
+        history.record(1000.0, {'temperature': 20.0})
+        self.assertEqual(
+            history.record(100.0, {'temperature': 10.0}), {}
+        )
+        self.assertEqual(
+            history.record(1001.0, {'temperature': 21.0, 'unknown': 1.0}),
+            {'temperature': 21.0}
+        )
+        tier = history.tiers('temperature')[0].window(0.0)
+        self.assertEqual(list(tier['timestamp']), [1000.0])
+        self.assertEqual(list(tier['mean']), [20.5])
+
+
+class AggregateTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(aggregate((), (50, )), {
+            'count': 0, 'min': None, 'max': None, 'mean': None,
+            'stddev': None, 'p50': None
+        })
+
+    def test_percentiles(self):
+        result = aggregate([4.0, 1.0, 3.0, 2.0], (0, 25, 50, 90, 100))
+        self.assertEqual(result['count'], 4)
+        self.assertEqual((result['min'], result['max']), (1.0, 4.0))
+        self.assertEqual(result['mean'], 2.5)
+        self.assertAlmostEqual(result['stddev'], 1.118033988749895)
+        self.assertEqual(
+            [result[k] for k in ('p0', 'p25', 'p50', 'p90', 'p100')],
+            [1.0, 1.75, 2.5, 3.7, 4.0]
+        )
+
+    def test_steps(self):
+        history = History(('t', ), 100)
+        for i in range(10):
+            history.record(100.0 + i, {'t': float(i)})
+        result = history.aggregate('t', 10, 110.0, 5)
+        self.assertEqual([b['timestamp'] for b in result], [100.0, 105.0])
+        self.assertEqual([b['count'] for b in result], [5, 5])
+        self.assertEqual([b['mean'] for b in result], [2.0, 7.0])
+
+    def test_numpy_matches_pure_python(self):
+        if numpy is None:
+            self.skipTest('numpy is not installed')
+        rng = random.Random(2)
+        history = History(('t', ), 1000)
+        timestamp = 1000.0
+        for i in range(500):
+            # bursts and gaps leave some steps empty
+            timestamp += rng.choice((0.1, 0.5, 7.0))
+            history.record(timestamp, {'t': rng.gauss(20.0, 3.0)})
+        args = ('t', timestamp - 1000.0, timestamp + 1.0, 3.0, (0, 10, 50, 99))
+        vectorized = history.aggregate(*args)
+        single = aggregate(history.window('t', 0)[1], (50, ))
+        try:
+            history_module.numpy = None
+            expected = history.aggregate(*args)
+            expected_single = aggregate(history.window('t', 0)[1], (50, ))
+        finally:
+            history_module.numpy = numpy
+        self.assertGreater(sum(1 for b in expected if b['count'] == 0), 0)
+        self.assertEqual(len(vectorized), len(expected))
+        for (actual, bucket) in zip(
+            vectorized + [single], expected + [expected_single]
+        ):
+            self.assertEqual(list(actual.keys()), list(bucket.keys()))
+            for (k, v) in bucket.items():
+                if v is None or k in ('count', 'timestamp'):
+                    self.assertEqual(actual[k], v)
+                else:
+                    self.assertAlmostEqual(actual[k], v, places=9)
+
+    def test_maintained_window(self):
+        history = History(('t', ), 100, windows_=(5, ))
+        for i in range(10):
+            history.record(100.0 + i, {'t': float(i)})
+        self.assertEqual(history.aggregate('t', 5, 109.0)['count'], 6)
+        self.assertEqual(history.aggregate('t', 5, 109.0)['mean'], 6.5)
+
+
+class HistoryQueryTest(unittest.TestCase):
+    def setUp(self):
+        # raw samples cover 100 s, 10 s buckets 1000 s, 100 s buckets
+        # 10000 s
+        self.history = History(
+            ('temperature', ), 100, tiers_=((10, 100), (100, 100))
+        )
+        self.now = 1000000.0
+        for i in range(20000):
+            self.history.record(
+                self.now - 19999 + i, {'temperature': float(i)}
+            )
+
+    def resolution(self, seconds_, resolution_=None):
+        return self.history.query(
+            'temperature', self.now - seconds_, None, resolution_
+        )['resolution']
+
+    def test_raw_samples_within_their_retention(self):
+        result = self.history.query('temperature', self.now - 50)
+        self.assertEqual(result['resolution'], 0)
+        self.assertEqual(len(result['value']), 51)
+        self.assertEqual(self.resolution(50, 5), 0)
+
+    def test_coarsest_fitting_tier(self):
+        self.assertEqual(self.resolution(50, 10), 10)
+        self.assertEqual(self.resolution(50, 1000), 100)
+        self.assertEqual(self.resolution(500, 50), 10)
+
+    def test_tier_beyond_raw_retention(self):
+        self.assertEqual(self.resolution(500), 10)
+        self.assertEqual(self.resolution(5000), 100)
+        self.assertEqual(self.resolution(5000, 10), 100)
+
+    def test_beyond_every_retention(self):
+        self.assertEqual(self.resolution(50000), 100)
+        self.assertEqual(self.resolution(50000, 1), 100)
+
+    def test_without_tiers(self):
+        history = History(('temperature', ), 10)
+        for i in range(100):
+            history.record(float(i), {'temperature': float(i)})
+        result = history.query('temperature', 0.0)
+        self.assertEqual(result['resolution'], 0)
+        self.assertEqual(len(result['value']), 10)
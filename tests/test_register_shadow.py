@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280, TSL2572
+
+
+class RegisterShadowTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = SimulatedSMBus({
+            0x77: SimulatedBME280(), 0x39: SimulatedTSL2572()
+        })
+
+    def test_bme280_skips_unchanged_writes(self):
+        sensor = BME280(0x77, self.bus, register_shadow_=True)
+        sensor.configure(filter_=4, humidity_oversampling_=2)
+        self.bus.reset_counter()
+        sensor.configure(filter_=4, humidity_oversampling_=2)
+        self.assertEqual(self.bus.transactions, 0)
+        sensor.configure(filter_=8)
+        self.assertEqual(self.bus.transactions, 1)
+        self.assertEqual(self.bus.devices[0x77].registers[0xF5] >> 2 & 7, 3)
+
+    def test_tsl2572_skips_unchanged_parameters(self):
+        sensor = TSL2572(0x39, self.bus, register_shadow_=True)
+        sensor.integrate(1, 200)
+        self.bus.reset_counter()
+        self.assertEqual(sensor.integrate(1, 200), (1000, 200))
+        self.assertEqual(self.bus.transactions, 4)
+
+    def test_clear_register_shadow_reads_again(self):
+        sensor = BME280(0x77, self.bus, register_shadow_=True)
+        sensor.configure(filter_=4)
+        self.bus.devices[0x77].registers[0xF5] = 0
+        sensor.clear_register_shadow()
+        self.assertEqual(sensor.get_filter(), 0)
+
+    def test_shadow_is_off_by_default(self):
+        sensor = BME280(0x77, self.bus)
+        sensor.configure(filter_=4)
+        self.bus.reset_counter()
+        sensor.configure(filter_=4)
+        self.assertEqual(self.bus.transactions, 1)
+        self.assertFalse(sensor.register_shadow)
+
+    def test_recover_forgets_the_shadow(self):
+        sensor = TSL2572(0x39, self.bus, register_shadow_=True)
+        sensor.integrate(1, 200)
+        self.bus.devices[0x39].registers[0x01] = 0x24
+        sensor.recover()
+        self.assertEqual(sensor.get_time(), 600)
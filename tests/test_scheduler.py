@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import time
+import unittest
+
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280, TSL2572, ThreadedCompositeSensor
+from pyrpzirsensor.scheduler import (
+    InterleavedScheduler, ScheduledSensor
+)
+
+
+class FullSampleLog(object):
+    """sample log on a disk which fills up once ``full`` is set
+    """
+
+    def __init__(self):
+        self.full = False
+        self.records = 0
+
+    def append(self, timestamp_, values_):
+        if self.full:
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        self.records += 1
+
+
+def wait_until(predicate_, timeout_=5.0):
+    deadline = time.monotonic() + timeout_
+    while not predicate_():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class InterleavedSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = SimulatedSMBus({0x77: SimulatedBME280()})
+        self.sensor = BME280(0x77, self.bus)
+        self.sensor.configure(
+            mode_='forced', filter_=4, humidity_oversampling_=2,
+            pressure_oversampling_=4, temperature_oversampling_=2
+        )
+        self.samples = []
+        self.scheduler = InterleavedScheduler(
+            (self.sensor, ), lambda s, v: self.samples.append(v),
+            interval=0.01, max_backoff=0.04
+        )
+
+    def step_until(self, predicate_, timeout_=5.0):
+        return wait_until(
+            lambda: self.scheduler.step() and predicate_(), timeout_
+        )
+
+    def test_fail_and_recover(self):
+        self.assertTrue(self.step_until(lambda: len(self.samples) >= 2))
+        del self.bus.devices[0x77]
+        self.assertTrue(self.step_until(
+            lambda: self.scheduler.statistics()[0]['errors'] >= 3
+        ))
+        statistics = self.scheduler.statistics()[0]
+        self.assertTrue(statistics['stale'])
+        self.assertGreaterEqual(statistics['consecutive_failures'], 3)
+        self.assertTrue(statistics['last_error'].startswith('OSError'))
+
+        # the sensor comes back after a power-on reset
+        device = SimulatedBME280()
+        self.bus.devices[0x77] = device
+        samples = len(self.samples)
+        self.assertTrue(self.step_until(
+            lambda: len(self.samples) > samples
+        ))
+        statistics = self.scheduler.statistics()[0]
+        self.assertFalse(statistics['stale'])
+        self.assertEqual(statistics['consecutive_failures'], 0)
+        self.assertEqual(self.sensor.get_filter(), 4)
+        self.assertEqual(self.sensor.get_humidity_oversampling(), 2)
+        self.assertEqual(self.sensor.get_pressure_oversampling(), 4)
+        self.assertEqual(self.sensor.get_temperature_oversampling(), 2)
+
+    def test_other_sensors_keep_sampling(self):
+        self.bus.devices[0x39] = SimulatedTSL2572()
+        illuminance = TSL2572(0x39, self.bus)
+        samples = []
+        scheduler = InterleavedScheduler(
+            (self.sensor, illuminance),
+            lambda s, v: samples.append(s), interval=0.01, max_backoff=0.04
+        )
+        del self.bus.devices[0x77]
+        self.assertTrue(wait_until(
+            lambda: scheduler.step() and samples.count(illuminance) >= 3
+        ))
+        self.assertNotIn(self.sensor, samples)
+        (bme280, tsl2572) = scheduler.statistics()
+        self.assertTrue(bme280['stale'])
+        self.assertFalse(tsl2572['stale'])
+
+    def test_backoff(self):
+        scheduled = ScheduledSensor(self.sensor, 0.5, max_backoff=3)
+        scheduled.start(time.monotonic())
+        backoffs = []
+        for _ in range(5):
+            scheduled.fail(time.monotonic(), OSError(121, 'Remote I/O error'))
+            backoffs.append(scheduled.backoff())
+        self.assertEqual(backoffs, [0.5, 1.0, 2.0, 3, 3])
+        self.assertEqual(scheduled.errors, 5)
+        scheduled.fail(time.monotonic(), TimeoutError())
+        self.assertEqual(scheduled.timeouts, 1)
+        scheduled.complete(time.monotonic())
+        self.assertEqual(scheduled.backoff(), 0.0)
+        self.assertFalse(scheduled.stale)
+
+
+class ThreadedCompositeSensorTest(unittest.TestCase):
+    def test_sample_log_failure_does_not_stop_sampling(self):
+        bus = SimulatedSMBus({0x77: SimulatedBME280()})
+        sample_log = FullSampleLog()
+        sensor = ThreadedCompositeSensor(
+            [BME280(0x77, bus)], interval=0.01, sample_log=sample_log
+        )
+        try:
+            sample_log.full = True
+            self.assertTrue(wait_until(
+                lambda: sensor.statistics()[0]['callback_errors'] >= 3
+            ))
+            sequence = sensor.sequence()
+            self.assertTrue(wait_until(
+                lambda: sensor.sequence() > sequence
+            ))
+            self.assertTrue(sensor.is_alive())
+            statistics = sensor.statistics()[0]
+            self.assertEqual(statistics['errors'], 0)
+            self.assertFalse(statistics['stale'])
+            self.assertTrue(
+                statistics['last_callback_error'].startswith('OSError')
+            )
+        finally:
+            sensor.stop()
+            sensor.join()
+
+    def test_unchanged_continuous_reading_is_not_recorded_again(self):
+        device = SimulatedTSL2572()
+        tsl2572 = TSL2572(0x39, SimulatedSMBus({0x39: device}))
+        tsl2572.start_continuous(threshold_=0.1, persistence_=2)
+        sample_log = FullSampleLog()
+        sensor = ThreadedCompositeSensor(
+            [tsl2572], interval=0.02, sample_log=sample_log
+        )
+        try:
+            self.assertTrue(wait_until(
+                lambda: sensor.statistics()[0]['samples'] >= 3
+            ))
+            (sequence, timestamp) = (sensor.sequence(), sensor.timestamp())
+            records = sample_log.records
+            samples = sensor.statistics()[0]['samples']
+            self.assertTrue(wait_until(
+                lambda: sensor.statistics()[0]['samples'] >= samples + 10
+            ))
+            self.assertEqual(sensor.sequence(), sequence)
+            self.assertEqual(sensor.timestamp(), timestamp)
+            self.assertEqual(sample_log.records, records)
+            health = sensor.health(2.0)['illuminance']
+            self.assertGreater(health['age'], 0.1)
+            self.assertFalse(health['stale'])
+            device.set_adc(2000, 400)
+            device.set_adc(2000, 400)
+            self.assertTrue(wait_until(
+                lambda: sensor.sequence() > sequence
+            ))
+            self.assertEqual(sample_log.records, records + 1)
+            self.assertGreater(sensor['illuminance'], 0.0)
+        finally:
+            sensor.stop()
+            sensor.join()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import unittest
+
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280
+from pyrpzirsensor.server import gen_app
+
+
+def wait_until(predicate_, timeout_=5.0):
+    deadline = time.monotonic() + timeout_
+    while not predicate_():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class ServerTestCase(unittest.TestCase):
+    config = {}
+
+    def setUp(self):
+        self.bme280 = SimulatedBME280()
+        self.tsl2572 = SimulatedTSL2572()
+        config = {
+            'I2C_BUS': SimulatedSMBus({
+                0x77: self.bme280, 0x39: self.tsl2572
+            }),
+            'BME280_MODE': 'forced'
+        }
+        config.update(self.config)
+        self.app = gen_app(config)
+        self.client = self.app.test_client()
+        # the initial values and one sample of each sensor
+        self.assertTrue(wait_until(
+            lambda: self.client.get('/api/sensor').json['sequence'] >= 3
+        ))
+
+
+class StreamTest(ServerTestCase):
+    config = {'SAMPLING_INTERVAL': 0.02, 'STREAM_KEEPALIVE': 0.1}
+
+    def temperature(self, adc_t_):
+        sensor = BME280(0x77, SimulatedSMBus({0x77: SimulatedBME280()}))
+        return sensor.get_temperature(adc_t=adc_t_)
+
+    def events(self, query_):
+        response = self.client.get(
+            '/api/sensor/stream?' + query_, buffered=False
+        )
+        self.addCleanup(response.close)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b'retry: 1000\n\n')
+        return chunks
+
+    def next_data(self, chunks_):
+        for chunk in chunks_:
+            if chunk.startswith(b'data: '):
+                return json.loads(chunk[6:].decode('utf-8'))
+            self.assertEqual(chunk, b': keepalive\n\n')
+
+    def test_attributes_and_deadband(self):
+        chunks = self.events('attributes=temperature&deadband=0.5')
+        first = self.next_data(chunks)
+        self.assertEqual(set(first), set(('temperature', 'timestamp')))
+        self.assertAlmostEqual(first['temperature'], self.temperature(519888))
+        # a change within the deadband is not sent, a larger one is
+        self.bme280.set_adc(415148, 519888 + 200, 30000)
+        self.assertLess(
+            abs(self.temperature(519888 + 200) - first['temperature']), 0.5
+        )
+        time.sleep(0.2)
+        self.bme280.set_adc(415148, 519888 + 4000, 30000)
+        self.assertGreater(
+            abs(self.temperature(519888 + 4000) - first['temperature']), 0.5
+        )
+        self.assertEqual(
+            self.next_data(chunks)['temperature'],
+            self.temperature(519888 + 4000)
+        )
+
+    def test_keepalive(self):
+        chunks = self.events('attributes=temperature&deadband=1000')
+        self.next_data(chunks)
+        self.assertEqual(next(chunks), b': keepalive\n\n')
+
+    def test_unsubscribe_on_close(self):
+        response = self.client.get('/api/sensor/stream', buffered=False)
+        next(iter(response.response))
+        dispatch = self.client.get('/api/status').json['dispatch']
+        self.assertEqual(len(dispatch['subscriptions']), 1)
+        response.close()
+        dispatch = self.client.get('/api/status').json['dispatch']
+        self.assertEqual(dispatch['subscriptions'], [])
+
+    def test_bad_requests(self):
+        for query in ('attributes=unknown', 'deadband=-1'):
+            response = self.client.get('/api/sensor/stream?' + query)
+            self.assertEqual(response.status_code, 400)
+
+
+class ConditionalRequestTest(ServerTestCase):
+    config = {
+        'BME280_SAMPLING_PERIOD': 60,
+        'ILLUMINANCE_SENSOR_SAMPLING_PERIOD': 0.05
+    }
+
+    def test_attribute(self):
+        response = self.client.get('/api/temperature')
+        self.assertEqual(response.status_code, 200)
+        body = response.json
+        self.assertEqual(set(body), set((
+            'temperature', 'timestamp', 'sequence'
+        )))
+        etag = response.get_etag()[0]
+        self.assertTrue(etag.endswith('-{}'.format(body['sequence'])))
+        max_age = response.cache_control.max_age
+        self.assertGreater(max_age, 50)
+        self.assertLessEqual(max_age, 60)
+        self.assertLess(body['timestamp'], time.time())
+
+        response = self.client.get(
+            '/api/temperature', headers={'If-None-Match': '"{}"'.format(etag)}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.get_etag()[0], etag)
+        self.assertLessEqual(response.cache_control.max_age, max_age)
+
+        response = self.client.get(
+            '/api/temperature', headers={'If-None-Match': '"other"'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_sample_changes_the_etag(self):
+        response = self.client.get('/api/illuminance')
+        etag = response.get_etag()[0]
+        self.assertEqual(response.cache_control.max_age, 0)
+        self.tsl2572.set_adc(2000, 400)
+        self.assertTrue(wait_until(
+            lambda: self.client.get('/api/illuminance').get_etag()[0] != etag
+        ))
+        response = self.client.get(
+            '/api/illuminance', headers={'If-None-Match': '"{}"'.format(etag)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json['sequence'], int(etag.split('-')[1]))
+
+    def test_humidity_key(self):
+        body = self.client.get('/api/humidity').json
+        self.assertIn('humidiry', body)
+
+
+class SnapshotResponseTest(ServerTestCase):
+    config = {'SAMPLING_INTERVAL': 60}
+
+    def test_sensor(self):
+        response = self.client.get('/api/sensor')
+        self.assertEqual(response.mimetype, 'application/json')
+        body = response.json
+        self.assertEqual(set(body), set((
+            'temperature', 'pressure', 'humidity', 'illuminance',
+            'timestamp', 'sequence'
+        )))
+        self.assertTrue(
+            response.get_etag()[0].endswith('-{}'.format(body['sequence']))
+        )
+        self.assertGreater(response.cache_control.max_age, 50)
+        # the pre-encoded body of the snapshot is served as it is
+        self.assertEqual(self.client.get('/api/sensor').data, response.data)
+
+        response = self.client.get('/api/sensor', headers={
+            'If-None-Match': '"{}"'.format(response.get_etag()[0])
+        })
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_body_matches_the_attribute_endpoints(self):
+        body = self.client.get('/api/sensor').json
+        for attr in ('temperature', 'pressure', 'illuminance'):
+            self.assertEqual(
+                self.client.get('/api/' + attr).json[attr], body[attr]
+            )
+        self.assertEqual(
+            self.client.get('/api/humidity').json['humidiry'],
+            body['humidity']
+        )
+
+
+class HistoryRequestTest(ServerTestCase):
+    config = {'SAMPLING_INTERVAL': 0.02}
+
+    def test_aggregate(self):
+        response = self.client.get(
+            '/api/sensor/aggregate?window=60&step=10&percentiles=50'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['temperature']), 6)
+        self.assertGreater(
+            sum(b['count'] for b in response.json['temperature']), 0
+        )
+
+    def test_non_finite_parameters(self):
+        for query in (
+            'aggregate?window=nan', 'aggregate?window=nan&step=1',
+            'aggregate?window=inf&step=1', 'aggregate?window=60&step=nan',
+            'aggregate?percentiles=nan', 'history?seconds=nan',
+            'history?seconds=-inf', 'history?resolution=nan',
+            'stream?deadband=nan'
+        ):
+            response = self.client.get('/api/sensor/' + query)
+            self.assertEqual(response.status_code, 400, query)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import unittest
+
+from pyrpzirsensor.bus import (
+    SimulatedSMBus, SimulatedBME280, SimulatedTSL2572
+)
+from pyrpzirsensor.i2c import BME280, TSL2572, ThreadedCompositeSensor
+from pyrpzirsensor.snapshot import Snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = Snapshot.encode(
+            5, ('a', 'b'), (1.5, 2.5), (100.0, 104.0), (3, 5), (1.0, 10.0)
+        )
+
+    def test_encode(self):
+        self.assertEqual(self.snapshot.timestamp, 104.0)
+        self.assertEqual(self.snapshot.expires, 101.0)
+        self.assertEqual(json.loads(self.snapshot.body.decode('utf-8')), {
+            'a': 1.5, 'b': 2.5, 'timestamp': 104.0, 'sequence': 5
+        })
+        self.assertEqual(list(self.snapshot.as_dict().items()), [
+            ('a', 1.5), ('b', 2.5)
+        ])
+
+    def test_lookup(self):
+        self.assertEqual(self.snapshot.get('b'), 2.5)
+        with self.assertRaises(KeyError):
+            self.snapshot.index('c')
+
+    def test_ages_and_staleness(self):
+        self.assertEqual(
+            dict(self.snapshot.ages(105.0)), {'a': 5.0, 'b': 1.0}
+        )
+        self.assertEqual(self.snapshot.stale(2.0, 105.0), ('a', ))
+        self.assertEqual(self.snapshot.stale(2.0, 101.0), ())
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.snapshot.sequence = 6
+
+
+class ThreadedCompositeSensorSnapshotTest(unittest.TestCase):
+    def test_readers_see_one_cycle(self):
+        bme280 = SimulatedBME280()
+        tsl2572 = SimulatedTSL2572()
+        bus = SimulatedSMBus({0x77: bme280, 0x39: tsl2572})
+        sensor = ThreadedCompositeSensor(
+            (BME280(0x77, bus), TSL2572(0x39, bus)), interval=0.001
+        )
+        try:
+            previous = sensor.snapshot()
+            deadline = time.monotonic() + 0.5
+            reads = 0
+            while time.monotonic() < deadline or previous.sequence < 10:
+                adc_t = 519888 + reads % 1000
+                bme280.set_adc(415148, adc_t, 30000)
+                tsl2572.set_adc(1000 + reads % 1000, 200)
+                snapshot = sensor.snapshot()
+                reads += 1
+                self.assertGreaterEqual(snapshot.sequence, previous.sequence)
+                self.assertEqual(snapshot.sequence, max(snapshot.sequences))
+                self.assertEqual(snapshot.timestamp, max(snapshot.timestamps))
+                document = json.loads(snapshot.body.decode('utf-8'))
+                self.assertEqual(document.pop('sequence'), snapshot.sequence)
+                self.assertEqual(
+                    document.pop('timestamp'), snapshot.timestamp
+                )
+                self.assertEqual(document, dict(snapshot.as_dict()))
+                self.assertEqual(
+                    tuple(sensor.attributes()), snapshot.attributes
+                )
+                previous = snapshot
+        finally:
+            sensor.stop()
+            sensor.join()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from pyrpzirsensor.history import History
+from pyrpzirsensor.storage import (
+    SampleLog, SampleSegment, GroupCommitWriter
+)
+
+
+class SampleLogTest(unittest.TestCase):
+    attributes = ('temperature', 'illuminance')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        log = SampleLog(self.directory, self.attributes)
+        log.append(1.0, {'temperature': 20.5, 'illuminance': 100.0})
+        log.append(2.0, {'temperature': 21.0})
+        log.append(3.0, {'illuminance': 120.0, 'unknown': 1.0})
+        log.close()
+        log = SampleLog(self.directory, self.attributes)
+        self.assertEqual(list(log.scan()), [
+            (1.0, {'temperature': 20.5, 'illuminance': 100.0}),
+            (2.0, {'temperature': 21.0}),
+            (3.0, {'illuminance': 120.0})
+        ])
+        self.assertEqual(
+            [t for (t, _) in log.scan(1.5, 3.0)], [2.0]
+        )
+        log.close()
+
+    def test_partial_record_is_truncated(self):
+        log = SampleLog(self.directory, self.attributes)
+        for i in range(3):
+            log.append(float(i), {'temperature': float(i)})
+        log.close()
+        (path, ) = log.segments()
+        with open(path, 'ab') as fout:
+            fout.write(b'\x00' * 5)
+        log = SampleLog(self.directory, self.attributes)
+        segment = SampleSegment(path)
+        self.assertEqual(
+            os.path.getsize(path),
+            segment.header_size + 3 * segment.record_size
+        )
+        log.append(3.0, {'temperature': 3.0})
+        self.assertEqual(
+            [v['temperature'] for (_, v) in log.scan()], [0.0, 1.0, 2.0, 3.0]
+        )
+        log.close()
+
+    def test_segments_rotate(self):
+        log = SampleLog(self.directory, self.attributes, segment_records_=4)
+        for i in range(10):
+            log.append(float(i), {'illuminance': float(i)})
+        log.close()
+        segments = log.segments()
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(
+            [len(SampleSegment(p)) for p in segments], [4, 4, 2]
+        )
+        log = SampleLog(self.directory, self.attributes, segment_records_=4)
+        log.append(10.0, {'illuminance': 10.0})
+        log.append(11.0, {'illuminance': 11.0})
+        log.append(12.0, {'illuminance': 12.0})
+        self.assertEqual(len(log.segments()), 4)
+        self.assertEqual(
+            [t for (t, _) in log.scan(8.5)], [9.0, 10.0, 11.0, 12.0]
+        )
+        log.close()
+
+    def test_other_attributes_start_a_new_segment(self):
+        log = SampleLog(self.directory, self.attributes)
+        log.append(1.0, {'temperature': 1.0})
+        log.close()
+        log = SampleLog(self.directory, ('pressure', ))
+        log.append(2.0, {'pressure': 1000.0})
+        log.close()
+        self.assertEqual(len(log.segments()), 2)
+        self.assertEqual(list(log.scan()), [
+            (1.0, {'temperature': 1.0}), (2.0, {'pressure': 1000.0})
+        ])
+
+    def test_restore(self):
+        log = SampleLog(self.directory, self.attributes)
+        for i in range(10):
+            log.append(float(i), {'temperature': float(i)})
+        history = History(self.attributes, 100)
+        log.restore(history, 5.0)
+        log.close()
+        (timestamps, values) = history.window('temperature', 0.0)
+        self.assertEqual(list(timestamps), [5.0, 6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(len(history['illuminance']), 0)
+
+    def test_broken_segment_is_skipped(self):
+        log = SampleLog(self.directory, self.attributes, segment_records_=2)
+        for i in range(4):
+            log.append(float(i), {'temperature': float(i)})
+        log.close()
+        with open(log.segments()[0], 'wb') as fout:
+            fout.write(b'broken')
+        self.assertEqual([t for (t, _) in log.scan()], [2.0, 3.0])
+
+
+class FailingSampleLog(SampleLog):
+    """sample log on a disk which has room for ``room`` more records once it
+    is set. the record which does not fit is written partially
+    """
+
+    room = None
+
+    def append(self, timestamp_, values_):
+        if self.room is not None:
+            if self.room == 0:
+                if self._SampleLog__file is not None:
+                    self._SampleLog__file.write(b'\0' * 5)
+                raise OSError(errno.ENOSPC, 'No space left on device')
+            self.room -= 1
+        super(FailingSampleLog, self).append(timestamp_, values_)
+
+
+class GroupCommitWriterTest(unittest.TestCase):
+    attributes = ('temperature', )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stop_commits_the_queued_samples(self):
+        writer = GroupCommitWriter(
+            SampleLog(self.directory, self.attributes), max_delay_=60.0
+        )
+        for i in range(5):
+            writer.append(float(i), {'temperature': float(i)})
+        writer.stop()
+        writer.stop()
+        self.assertEqual(writer.statistics()['committed'], 5)
+        sample_log = SampleLog(self.directory, self.attributes)
+        self.assertEqual(
+            [t for (t, _) in sample_log.scan()], [0.0, 1.0, 2.0, 3.0, 4.0]
+        )
+        sample_log.close()
+
+    def test_failed_commits_are_counted(self):
+        sample_log = FailingSampleLog(self.directory, self.attributes)
+        writer = GroupCommitWriter(sample_log, max_batch_=2)
+        sample_log.room = 0
+        for i in range(5):
+            writer.append(float(i), {'temperature': float(i)})
+        writer.stop()
+        statistics = writer.statistics()
+        self.assertEqual(statistics['committed'], 0)
+        self.assertEqual(statistics['failed'], 5)
+        self.assertEqual(statistics['errors'], 3)
+
+    def test_failure_in_the_middle_of_a_batch(self):
+        sample_log = FailingSampleLog(self.directory, self.attributes)
+        for i in range(3):
+            sample_log.append(float(i), {'temperature': float(i)})
+        sample_log.room = 3
+        writer = GroupCommitWriter(sample_log, max_batch_=5)
+        for i in range(3, 8):
+            writer.append(float(i), {'temperature': float(i)})
+        deadline = time.monotonic() + 5.0
+        while writer.errors == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sample_log.room = None
+        for i in range(8, 10):
+            writer.append(float(i), {'temperature': float(i)})
+        writer.stop()
+        statistics = writer.statistics()
+        self.assertEqual(statistics['errors'], 1)
+        self.assertEqual(statistics['failed'], 2)
+        self.assertEqual(statistics['committed'], 5)
+        sample_log = SampleLog(self.directory, self.attributes)
+        self.assertEqual(
+            [(t, v['temperature']) for (t, v) in sample_log.scan()],
+            [(float(i), float(i)) for i in (0, 1, 2, 3, 4, 5, 8, 9)]
+        )
+        sample_log.close()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pyrpzirsensor.bus import SimulatedSMBus, SimulatedTSL2572
+from pyrpzirsensor.i2c import TSL2572
+
+
+class TSL2572ContinuousTest(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedTSL2572()
+        self.bus = SimulatedSMBus({0x39: self.device})
+        self.sensor = TSL2572(0x39, self.bus)
+
+    def test_persistence_delays_the_interrupt(self):
+        self.sensor.start_continuous(threshold_=0.1, persistence_=2)
+        self.sensor.get_adc()
+        self.device.set_adc(1000, 200)
+        self.assertFalse(self.sensor.is_interrupted())
+        self.device.set_adc(2000, 400)
+        self.assertFalse(self.sensor.is_interrupted())
+        self.device.set_adc(2000, 400)
+        self.assertTrue(self.sensor.is_interrupted())
+        ((ch0, _), _) = self.sensor.get_adc()
+        self.assertEqual(ch0, 2000)
+
+    def test_one_shot_after_stop_continuous(self):
+        self.sensor.start_continuous(threshold_=0.1, persistence_=2)
+        self.sensor.get_adc()
+        self.sensor.stop_continuous()
+        self.assertEqual(self.device.registers[0x0C], 0)
+        self.device.set_adc(3000, 600)
+        ((ch0, _), _) = self.sensor.get_adc()
+        self.assertEqual(ch0, 3000)
+
+    def test_reinitialize_clears_persistence(self):
+        self.sensor.set_persistence(5)
+        self.sensor.reinitialize()
+        self.assertEqual(self.device.registers[0x0C], 0)
+        ((ch0, _), _) = self.sensor.get_adc()
+        self.assertEqual(ch0, 1000)